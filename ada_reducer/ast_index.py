@@ -0,0 +1,99 @@
+from ada_reducer.types import sloc_of
+
+
+class ASTIndex(object):
+    """The nodes of one analysis unit, bucketed by kind.
+
+    The index is built in a single traversal of the tree, which records
+    for each node its rank in the traversal and its sloc range as a
+    (start line, start column, end line, end column) tuple. Strategies
+    query it instead of walking the tree with findall.
+    """
+
+    def __init__(self, unit):
+        self.unit = unit
+        self.buckets = {}
+        # keys: node classes
+        # values: lists of (rank, node, sloc tuple), in traversal order
+
+        self.queries = {}
+        # Cache of the results of self.entries
+
+        if unit.root is not None:
+            self.build(unit.root)
+
+    def build(self, root):
+        """Traverse the tree rooted at root, in prefix order"""
+        rank = 0
+        to_visit = [root]
+        while to_visit:
+            node = to_visit.pop()
+            self.buckets.setdefault(type(node), []).append((rank, node, sloc_of(node)))
+            rank += 1
+            to_visit.extend(c for c in reversed(node.children) if c is not None)
+
+    def entries(self, *kinds):
+        """Return the list of (node, sloc tuple) for all nodes which
+        are instances of one of kinds, in prefix order, like findall would.
+        """
+        if kinds not in self.queries:
+            matches = []
+            for kind, bucket in self.buckets.items():
+                if issubclass(kind, kinds):
+                    matches.extend(bucket)
+            matches.sort(key=lambda e: e[0])
+            self.queries[kinds] = [(node, sloc) for _, node, sloc in matches]
+        return self.queries[kinds]
+
+    def nodes(self, *kinds):
+        """Return the nodes which are instances of one of kinds, in
+        prefix order.
+        """
+        return [node for node, _ in self.entries(*kinds)]
+
+
+class IndexCache(object):
+    """Keeps the indexes of the units of one analysis context"""
+
+    def __init__(self):
+        self.context = None
+        self.indexes = {}
+        # keys: file names, values: ASTIndex
+
+    def get(self, unit):
+        """Return the index for unit, building it if needed"""
+        if self.context is None or unit.context != self.context:
+            # A new context: the indexes of the previous one are stale
+            self.invalidate()
+            self.context = unit.context
+
+        if unit.filename not in self.indexes:
+            self.indexes[unit.filename] = ASTIndex(unit)
+        return self.indexes[unit.filename]
+
+    def invalidate(self, filename=None):
+        """Forget the index of filename, or all indexes if filename is None.
+        This must be called when a unit is reparsed.
+        """
+        if filename is None:
+            self.context = None
+            self.indexes = {}
+        else:
+            self.indexes.pop(filename, None)
+
+    def adopt(self, context, index):
+        """Make context the current context, with index already built
+        for one of its units.
+        """
+        if context != self.context:
+            self.invalidate()
+            self.context = context
+        self.indexes[index.unit.filename] = index
+
+
+INDEXES = IndexCache()
+
+
+def index_of(unit):
+    """Return the index of unit"""
+    return INDEXES.get(unit)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+"""Reduce many testcases at once, sharing the machine between them.
+
+The manifest is a JSON list of jobs, for instance:
+
+    [
+        {
+            "name": "bug-1234",
+            "dir": "bug-1234",
+            "project": "p.gpr",
+            "predicate": "oracle.sh",
+            "args": ["--single-file", "main.adb"],
+            "priority": 2,
+            "time_budget": 3600
+        }
+    ]
+
+name identifies the job, and must be unique in the manifest.
+dir, relative to the manifest, is where the job runs: project and
+predicate are relative to it. args are passed to adareducer as is.
+priority (1 by default) and the budgets (time_budget,
+max_predicate_calls, target_size) are optional.
+
+Each job is an adareducer process, with its output in LOG_DIR/NAME.log.
+The jobs ask this process for a slot before each run of a predicate: at
+most --slots predicates run at any time, and a free slot goes to the job
+among the jobs waiting for one, to the job which used the least
+predicate time so far, relative to its priority.
+All the jobs share the same project cache.
+
+    python -m ada_reducer.batch MANIFEST [--slots N] [--max-jobs N]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from ada_reducer.distributed import parse_address, send_message
+from ada_reducer.gui import log
+from ada_reducer.project_support import default_cache_dir
+
+
+class SlotPool(object):
+    """Grants the predicate slots to the jobs"""
+
+    def __init__(self, slots, priorities):
+        self.free = slots
+        self.priorities = priorities
+        # keys: job names, values: weights
+
+        self.used = {}
+        # keys: job names, values: seconds spent running predicates
+
+        self.waiting = []
+        # (arrival number, job name) of the requests waiting for a slot
+        self.arrivals = 0
+
+        self.condition = threading.Condition()
+
+    def next_request(self):
+        """Return the waiting request which gets the next free slot"""
+        return min(
+            self.waiting,
+            key=lambda r: (self.used.get(r[1], 0) / self.priorities.get(r[1], 1), r),
+        )
+
+    def acquire(self, job):
+        """Wait for a slot for job, return the time it was granted"""
+        with self.condition:
+            request = (self.arrivals, job)
+            self.arrivals += 1
+            self.waiting.append(request)
+            while self.free == 0 or self.next_request() != request:
+                self.condition.wait()
+            self.waiting.remove(request)
+            self.free -= 1
+            return time.monotonic()
+
+    def release(self, job, granted):
+        with self.condition:
+            self.used[job] = self.used.get(job, 0) + time.monotonic() - granted
+            self.free += 1
+            self.condition.notify_all()
+
+
+class SlotServer(object):
+    """Serves the requests of the jobs for predicate slots over TCP, on
+    the loopback interface: messages are JSON objects, one per line.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.address = "{}:{}".format(*self.server.getsockname())
+
+    def start(self):
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        while True:
+            sock, _ = self.server.accept()
+            thread = threading.Thread(target=self.serve_job, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def serve_job(self, sock):
+        granted = None
+        job = None
+        try:
+            with sock, sock.makefile("rb") as stream:
+                for line in stream:
+                    message = json.loads(line)
+                    if message["op"] == "acquire":
+                        job = message["job"]
+                        granted = self.pool.acquire(job)
+                        send_message(sock, {"op": "granted"})
+                    elif message["op"] == "release" and granted is not None:
+                        self.pool.release(job, granted)
+                        granted = None
+        except (OSError, ValueError) as e:
+            log(f"lost job {job}: {e}")
+        if granted is not None:
+            # The job died while holding a slot
+            self.pool.release(job, granted)
+
+
+class SlotClient(object):
+    """The job side: asks the batch process for a slot before each run of
+    a predicate.
+    """
+
+    def __init__(self, address, job):
+        self.job = job
+        self.sock = socket.create_connection(parse_address(address))
+        # Send the requests right away, they are small
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stream = self.sock.makefile("rb")
+
+    @contextmanager
+    def slot(self):
+        """Context manager holding a slot during its body"""
+        send_message(self.sock, {"op": "acquire", "job": self.job})
+        reply = json.loads(self.stream.readline())
+        assert reply["op"] == "granted"
+        try:
+            yield
+        finally:
+            send_message(self.sock, {"op": "release"})
+
+
+def job_command(job, slot_server, cache_dir):
+    """Return the command line running job"""
+    command = [sys.executable, "-m", "ada_reducer.main"]
+    command += ["--slot-server", slot_server, "--job-name", job["name"]]
+    command += ["--cache-dir", cache_dir]
+    for key in ("time_budget", "max_predicate_calls", "target_size"):
+        if job.get(key) is not None:
+            command += ["--" + key.replace("_", "-"), str(job[key])]
+    command += job.get("args", [])
+    command += [job["project"], job["predicate"]]
+    return command
+
+
+def run_batch(jobs, root, slots, max_jobs, cache_dir, log_dir):
+    """Run the jobs of a manifest in root, return {name: exit status}"""
+    pool = SlotPool(slots, {j["name"]: j.get("priority", 1) for j in jobs})
+    server = SlotServer(pool)
+    server.start()
+
+    # The jobs import ada_reducer from here
+    env = dict(os.environ)
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(
+        [package_dir] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+    )
+
+    os.makedirs(log_dir, exist_ok=True)
+    to_start = sorted(jobs, key=lambda j: -j.get("priority", 1))
+    running = {}
+    # keys: job names, values: (process, log file, start time)
+    results = {}
+
+    while to_start or running:
+        while to_start and len(running) < max_jobs:
+            job = to_start.pop(0)
+            out = open(os.path.join(log_dir, job["name"] + ".log"), "w")
+            process = subprocess.Popen(
+                job_command(job, server.address, cache_dir),
+                cwd=os.path.join(root, job.get("dir", ".")),
+                env=env,
+                stdout=out,
+                stderr=subprocess.STDOUT,
+            )
+            log(f"started {job['name']}")
+            running[job["name"]] = (process, out, time.monotonic())
+
+        time.sleep(0.1)
+        for name, (process, out, start) in list(running.items()):
+            if process.poll() is not None:
+                out.close()
+                del running[name]
+                results[name] = process.returncode
+                used = pool.used.get(name, 0)
+                log(
+                    f"done {name}: status {process.returncode},"
+                    f" {time.monotonic() - start:.0f}s,"
+                    f" {used:.0f}s running predicates"
+                )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reduce the testcases listed in a manifest."
+    )
+    parser.add_argument("manifest")
+    parser.add_argument(
+        "--slots",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="How many predicates may run at the same time"
+        " (default: the number of processors).",
+    )
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        help="How many jobs may run at the same time (default: twice the"
+        " number of slots).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        help="The project cache shared by the jobs.",
+    )
+    parser.add_argument(
+        "--log-dir",
+        default="logs",
+        help="Where to write the output of each job.",
+    )
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        jobs = json.load(f)
+    names = [job["name"] for job in jobs]
+    for name in sorted({n for n in names if names.count(n) > 1}):
+        parser.error(f"job name {name} appears more than once in {args.manifest}")
+    results = run_batch(
+        jobs,
+        os.path.dirname(os.path.abspath(args.manifest)),
+        args.slots,
+        args.max_jobs or 2 * args.slots,
+        os.path.abspath(args.cache_dir),
+        os.path.abspath(args.log_dir),
+    )
+    sys.exit(0 if all(status == 0 for status in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
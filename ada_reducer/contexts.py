@@ -0,0 +1,158 @@
+"""Keep the memory used by the analysis context within bounds.
+
+Libadalang cannot unload a unit from an analysis context: when the
+context holds too many units, or the process uses too much memory, it is
+replaced with a fresh one, in which the units used most recently are
+loaded again.
+"""
+
+import collections
+import os
+import sys
+
+import libadalang as lal
+
+from ada_reducer.ast_index import INDEXES
+from ada_reducer.gui import log
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# The number of units loaded again in a recycled context, when there is
+# no limit on the number of units
+HOT_UNITS = 32
+
+
+def current_rss():
+    """Return the resident memory of the process in bytes, None if it
+    is not known. Where /proc is not available, this is the peak.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss()
+
+
+def peak_rss():
+    """Return the peak resident memory of the process in bytes, None if it
+    is not known.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ContextManager(object):
+    """Provides the analysis context to use, and the units of the files
+    the reducer works on, recycling the context when it gets too large.
+    """
+
+    def __init__(self, unit_provider, max_units=None, max_rss=None, sources=()):
+        self.unit_provider = unit_provider
+        self.max_units = max_units
+        self.max_rss = max_rss
+        # Recycle the context when it holds more than max_units units or
+        # when the process uses more than max_rss bytes, if not None
+
+        self.sources = list(sources)
+        # All the files which may be loaded in the context, see unit_count
+
+        self.hot = max(1, max_units // 2) if max_units else HOT_UNITS
+        # The number of units to keep when recycling
+
+        self.context = None
+        self.units = collections.OrderedDict()
+        # The files requested in self.context, least recently used first
+
+        self.loaded = None
+        # The number of files requested since the context was last
+        # recycled, None if it never was
+
+        self.recycles = 0
+        self.reset()
+
+    def reset(self):
+        """Start over with a fresh context, to see the latest version of
+        the sources.
+        """
+        # The indexes keep the nodes, and so the context, alive
+        INDEXES.invalidate()
+        self.adopt(lal.AnalysisContext(unit_provider=self.unit_provider))
+
+    def refresh(self, files):
+        """Parse again the units of files loaded in the context, so that
+        it sees their latest version. Nodes obtained from these units
+        must not be used any more.
+        """
+        for file in files:
+            if self.context.has_unit(file):
+                self.context.get_from_file(file, reparse=True)
+
+    def adopt(self, context, files=()):
+        """Make context the current context, with files loaded already"""
+        self.context = context
+        self.units = collections.OrderedDict((f, None) for f in files)
+
+    def unit_count(self):
+        """Return the number of units in the context, including those
+        libadalang loaded to resolve names.
+        """
+        count = sum(1 for f in self.sources if self.context.has_unit(f))
+        # The requested files may not all be in sources
+        return max(count, len(self.units))
+
+    def over_budget(self):
+        """Return True iff the context should be recycled"""
+        if not self.units:
+            # Fresh already
+            return False
+        if self.loaded is not None and self.loaded < self.hot:
+            # Just recycled: the memory of the previous context may
+            # not have been given back to the system.
+            return False
+        if self.max_units is not None and self.unit_count() >= self.max_units:
+            return True
+        if self.max_rss is not None:
+            rss = current_rss()
+            return rss is not None and rss > self.max_rss
+        return False
+
+    def recycle(self):
+        """Replace the context with a fresh one, in which the units used
+        most recently are loaded again.
+        """
+        hot = list(self.units)[-self.hot :]
+        self.recycles += 1
+        log(f"   recycling the analysis context ({self.unit_count()} units)")
+        self.reset()
+        for file in hot:
+            self.context.get_from_file(file)
+            self.units[file] = None
+        self.loaded = 0
+
+    def get_from_file(self, file):
+        """Return the unit for file. This may recycle the context: units
+        obtained from previous calls must not be used any more.
+        """
+        if file not in self.units and self.over_budget():
+            self.recycle()
+        unit = self.context.get_from_file(file)
+        if file in self.units:
+            self.units.move_to_end(file)
+        else:
+            self.units[file] = None
+            if self.loaded is not None:
+                self.loaded += 1
+        return unit
+
+    def report(self):
+        """Return a printable summary of the memory used"""
+        peak = peak_rss()
+        peak = "unknown" if peak is None else f"{peak / 2 ** 20:.0f} MB"
+        return f"Peak memory: {peak}, {self.recycles} analysis contexts recycled"
@@ -1,22 +1,36 @@
 import os
-from ada_reducer.types import Buffer
+from ada_reducer.types import BufferSet
+from ada_reducer.workspace import CHANGES
 from ada_reducer.interfaces import StrategyInterface
 
 
+def looks_empty(buf):
+    """Return True iff buf is small enough to attempt deleting its file"""
+    # for now don't even use LAL, just delete files that look small
+    return len(buf.lines) <= 5
+
+
 class DeleteEmptyUnits(StrategyInterface):
     """ Remove blank lines and standalone comments """
 
-    def run_on_file(self, context, file, predicate):
-        buf = Buffer(file)
+    def run_on_file(self, context, file, predicate, buffers=None):
+        if buffers is None:
+            buffers = BufferSet()
+        buf = buffers[file]
 
-        # for now don't even use LAL, just delete files that look small
-        if len(buf.lines) <= 5:
+        if looks_empty(buf):
+            del buffers[file]
             os.remove(file)
+            CHANGES.add(file)
 
-            if predicate():
-                return True
-            else:
-                # if the predicate failed, put back the original file
-                buf.save()
+            passed = False
+            try:
+                passed = predicate()
+            finally:
+                if not passed:
+                    # if the predicate failed, put back the original file
+                    buf.save()
+                    buffers[file] = buf
+            return passed
 
         return False
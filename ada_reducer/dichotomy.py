@@ -1,44 +1,102 @@
 from ada_reducer.gui import log
+from ada_reducer.interfaces import ChunkInterface
+from ada_reducer.priors import KIND_PRIORS, UNLIKELY
 
 
-def dichotomize(chunks, predicate, save):
+def dichotomize(chunks, predicate, save, snapshot=None):
     """Apply dichotomy for actionable chunks
 
+       snapshot, if not None, is a function returning an object with
+       a restore() method, for instance BufferSet.snapshot: a failed
+       attempt is then rolled back by restoring the snapshot taken before
+       it, instead of undoing the chunks one by one.
+
+       When a group of chunks fails, it is split according to KIND_PRIORS:
+       the chunks of kinds which are rarely actioned are split in halves
+       apart from the others, which are tried together, or split in halves
+       by decreasing probability if all are alike.
+       Whatever the grouping, chunks are applied in reverse order of
+       their position in chunks.
+
        Return a tuple
           (chunks that could be actioned,
            chunks that could not be actioned)
+       in the order of chunks.
     """
+    position = {id(c): j for j, c in enumerate(chunks)}
+
+    def key(chunk):
+        return position[id(chunk)]
+
+    actioned, not_actioned = _dichotomize(chunks, predicate, save, snapshot, key)
+    return (sorted(actioned, key=key), sorted(not_actioned, key=key))
+
+
+def split(chunks):
+    """Return the groups in which to try chunks, which failed together"""
+    probability = {id(c): KIND_PRIORS.probability(c) for c in chunks}
+    likely = [c for c in chunks if probability[id(c)] >= UNLIKELY]
+    unlikely = [c for c in chunks if probability[id(c)] < UNLIKELY]
+    if likely and unlikely:
+        mid = int(len(unlikely) / 2)
+        groups = [likely, unlikely[0:mid], unlikely[mid:]]
+        return [g for g in groups if g]
+
+    ordered = sorted(chunks, key=lambda c: -probability[id(c)])
+    mid = int(len(ordered) / 2)
+    return [ordered[0:mid], ordered[mid:]]
+
+
+def _dichotomize(chunks, predicate, save, snapshot, position):
+    if snapshot is not None:
+        before = snapshot()
+
     # Action all chunks
 
-    # Assume chunks are ordered and process them in
-    # reverse order (for the case where chunks are nested
-    # in each other or modify line numbers)
-    for chunk in reversed(chunks):
+    # Process them in reverse order (for the case where chunks
+    # are nested in each other or modify line numbers)
+    for chunk in sorted(chunks, key=position, reverse=True):
         chunk.do()
     save()
 
-    if predicate():
+    passed = False
+    KIND_PRIORS.attempt(chunks)
+    try:
+        passed = predicate()
+    finally:
+        # Also roll back if the predicate raised, for instance
+        # BudgetExhausted
+        if not passed:
+            if snapshot is not None:
+                before.restore()
+            else:
+                for chunk in chunks:
+                    chunk.undo()
+            save()
+
+    if passed:
         # Yay! all chunks could be actioned
         return (chunks, [])
     else:
         # Not all chunks could not be actioned...
-        for chunk in chunks:
-            chunk.undo()
-        save()
         if len(chunks) <= 1:
             # We've dichotomized as much as we could.
             return ([], chunks)
 
         # We've got to dichotomize more
-        mid = int(len(chunks) / 2)
+        actioned = []
+        not_actioned = []
+        for group in split(chunks):
+            a, n = _dichotomize(group, predicate, save, snapshot, position)
+            actioned += a
+            not_actioned += n
 
-        actioned_l, not_actioned_l = dichotomize(chunks[0:mid], predicate, save)
-        actioned_r, not_actioned_r = dichotomize(chunks[mid:], predicate, save)
-
-        return (actioned_l + actioned_r, not_actioned_l + not_actioned_r)
+        return (actioned, not_actioned)
 
 
 class TreeNode(object):
+    __slots__ = ("element", "children")
+
     def __init__(self, element):
         self.element = element  # non-leaf nodes may have None as element
         self.children = []
@@ -62,33 +120,77 @@ class TreeNode(object):
         return self.debugstr()
 
 
+class LazyTreeNode(object):
+    """A node of a chunk tree whose children are only computed when they
+    are needed, that is when dichototree could not action the element.
+    """
+
+    __slots__ = ("element", "expand", "expanded")
+
+    def __init__(self, element, expand=None):
+        self.element = element
+        self.expand = expand
+        # A function returning the list of children, None for a leaf
+
+        self.expanded = None
+        # The list of children, once computed
+
+    def do(self):
+        self.element.do()
+
+    def undo(self):
+        self.element.undo()
+
+    @property
+    def children(self):
+        if self.expanded is None:
+            self.expanded = self.expand() if self.expand is not None else []
+            self.expand = None
+        return self.expanded
+
+
 def to_tree(chunks):
     """Take a list of chunks and return a tree of them.
-       chunks must have a is_in() function.
+       chunks must have start and end attributes, see ChunkInterface.
+
+       A chunk is placed under the innermost chunk which contains it.
+       Chunks with identical ranges are nested in the order of the list.
     """
     result = TreeNode(None)
 
-    def place_in(root, candidate):
-        for child in root.children:
-            if candidate.element.is_in(child.element):
-                return place_in(child, candidate)
-        root.children.append(candidate)
-
-    for c in chunks:
-        place_in(result, TreeNode(c))
+    # Sort the chunks by increasing start and decreasing end: this way,
+    # each chunk comes after all the chunks which contain it.
+    ordered = sorted(chunks, key=lambda c: (c.start, -c.end[0], -c.end[1]))
+
+    # The stack of the chunks containing the current one, innermost last,
+    # and their ends. Since the current chunk does not start before any
+    # chunk in the stack, it is contained in a chunk of the stack iff it
+    # does not end after it.
+    stack = [result]
+    ends = [None]
+    for c in ordered:
+        while len(stack) > 1 and ends[-1] < c.end:
+            stack.pop()
+            ends.pop()
+        node = TreeNode(c)
+        stack[-1].children.append(node)
+        stack.append(node)
+        ends.append(c.end)
 
     return result
 
 
-def dichototree(chunks_tree, predicate, save):
+def dichototree(chunks_tree, predicate, save, snapshot=None):
     """Dichotomize the tree, first attempting the topmost level,
        then descending the exploration as levels fail.
+
+       See dichotomize for snapshot.
     """
     to_test = list(chunks_tree.children)
     level = 0
     while to_test:
         level += 1
-        actioned, not_actioned = dichotomize(to_test, predicate, save)
+        actioned, not_actioned = dichotomize(to_test, predicate, save, snapshot)
         log(
             f"{level * ' '} level {level}: {len(actioned)} actioned, "
             + f"{len(not_actioned)} not actioned"
@@ -98,3 +200,45 @@ def dichototree(chunks_tree, predicate, save):
         for x in not_actioned:
             for c in x.children:
                 to_test.append(c)
+
+
+class ChunkGroup(ChunkInterface):
+    """The topmost chunks of one file, actioned together"""
+
+    __slots__ = ("file", "chunks", "start", "end", "kind")
+
+    def __init__(self, file, chunks):
+        self.file = file
+        self.chunks = chunks
+        self.start = chunks[0].start
+        self.end = chunks[-1].end
+        self.kind = "file"
+
+    def do(self):
+        # The chunks are ordered and disjoint: process them in reverse
+        # order, as in dichotomize.
+        for chunk in reversed(self.chunks):
+            chunk.do()
+
+
+def to_forest(chunks_by_file):
+    """Take a list of (file, chunks) and return a tree with one node per
+       file, holding a ChunkGroup of the topmost chunks of the file, with
+       the tree of the chunks of that file as children.
+
+       Running dichototree on the result first attempts whole files.
+       The node of a file with a single topmost chunk is that of the chunk,
+       which would otherwise be attempted twice.
+    """
+    result = TreeNode(None)
+    for file, chunks in chunks_by_file:
+        tree = to_tree(chunks)
+        if not tree.children:
+            continue
+        if len(tree.children) == 1:
+            result.children.append(tree.children[0])
+            continue
+        node = TreeNode(ChunkGroup(file, [c.element for c in tree.children]))
+        node.children = tree.children
+        result.children.append(node)
+    return result
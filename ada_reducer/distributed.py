@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+"""Run the predicate on worker processes, possibly on other hosts.
+
+The coordinator (the reducer) connects to each worker over TCP and sends
+it a base snapshot of the workspace: the sources of the project, the
+project files and the predicate. For each predicate evaluation, it then
+sends the diff between the current state of the workspace and that base,
+as a mapping from relative paths to content digests, along with the
+contents the worker does not have yet. The worker updates its own copy,
+runs the predicate there and sends back the verdict. The predicate is
+told which files changed in the copy since its previous run on the same
+worker, see predicate_environment.
+
+Messages are JSON objects, one per line. Workers execute whatever they
+are asked to: only run them on trusted networks.
+
+To start a worker:
+
+    python -m ada_reducer.distributed --listen 127.0.0.1:7000 --workdir /tmp/w1
+"""
+
+import argparse
+import base64
+import json
+import os
+import selectors
+import socket
+import tempfile
+import time
+
+from ada_reducer.gui import log
+from ada_reducer.predicate import predicate_environment, run_script
+
+
+# Seconds to wait when connecting to a worker
+CONNECT_TIMEOUT = 10
+
+
+def parse_address(address):
+    """Return (host, port) for an address of the form host:port"""
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def send_message(sock, message):
+    sock.sendall(json.dumps(message).encode() + b"\n")
+
+
+def encode_blobs(workspace, state):
+    """Return the contents of the files in state, as a dict
+    {digest: base64 contents}.
+    """
+    blobs = {}
+    for relative, digest in state.items():
+        if digest is not None and digest not in blobs:
+            blobs[digest] = base64.b64encode(workspace.read(relative)).decode()
+    return blobs
+
+
+class Connection(object):
+    """The coordinator side of the connection to one worker"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sock = None
+        self.alive = True
+
+        self.base = None
+        # The base snapshot sent to the worker
+
+        self.current = {}
+        # The state of the copy of the workspace on the worker
+
+        self.pending = None
+        # The id of the evaluation the worker is running, if any
+
+        self.received = b""
+
+    def __str__(self):
+        return "{}:{}".format(*self.address)
+
+    def receive(self):
+        """Read what is available on the socket, return the list of
+        complete messages.
+        """
+        data = self.sock.recv(1 << 16)
+        if not data:
+            raise ConnectionError(f"worker {self} disconnected")
+        self.received += data
+        *lines, self.received = self.received.split(b"\n")
+        return [json.loads(line) for line in lines if line]
+
+
+class WorkerPool(object):
+    """Evaluate the predicate on remote workers"""
+
+    def __init__(self, addresses, workspace, timeout):
+        self.workspace = workspace
+        self.timeout = timeout
+        # Seconds after which an evaluation which is still running is
+        # also sent to another worker
+
+        self.connections = [Connection(parse_address(a)) for a in addresses]
+        self.selector = selectors.DefaultSelector()
+
+        # Connect right away, so that the workers get a base snapshot
+        # of the workspace before it is modified.
+        for conn in self.connections:
+            self.connect(conn)
+
+    def connect(self, conn):
+        """Connect to the worker and send it the base snapshot"""
+        try:
+            conn.sock = socket.create_connection(conn.address, CONNECT_TIMEOUT)
+            conn.sock.settimeout(None)
+            conn.base = self.workspace.state()
+            send_message(
+                conn.sock,
+                {
+                    "op": "base",
+                    "files": conn.base,
+                    "blobs": encode_blobs(self.workspace, conn.base),
+                },
+            )
+            conn.current = dict(conn.base)
+            self.selector.register(conn.sock, selectors.EVENT_READ, conn)
+        except OSError as e:
+            self.drop(conn, e)
+
+    def drop(self, conn, reason):
+        """Stop using a worker"""
+        log(f"worker {conn} dropped: {reason}")
+        conn.alive = False
+        if conn.sock is not None:
+            try:
+                self.selector.unregister(conn.sock)
+            except (KeyError, ValueError):
+                pass
+            conn.sock.close()
+            conn.sock = None
+
+    def start(self, conn, eval_id, state, script, cwd):
+        """Send an evaluation to the worker, return False if it's dead"""
+        # The diff is against the base, but only the contents which the
+        # worker does not have in its current copy need to be sent.
+        diff = {r: d for r, d in state.items() if conn.base.get(r) != d}
+        changed = {r: d for r, d in state.items() if conn.current.get(r) != d}
+        message = {
+            "op": "eval",
+            "id": eval_id,
+            "files": diff,
+            "blobs": encode_blobs(self.workspace, changed),
+            "script": self.workspace.relative(script),
+            "cwd": self.workspace.relative(cwd),
+        }
+        try:
+            send_message(conn.sock, message)
+        except OSError as e:
+            self.drop(conn, e)
+            return False
+        conn.current = dict(state)
+        conn.pending = eval_id
+        return True
+
+    def evaluate(self, script, cwd, state_id):
+        """Run the predicate on the workers, in the current state of the
+        workspace, which the predicate knows as state_id.
+
+        Return (True iff the predicate returned 0, its output), or None if
+        no worker could do it.
+        """
+        eval_id = state_id
+        state = self.workspace.state()
+        deadline = None
+
+        while True:
+            live = [c for c in self.connections if c.alive]
+            running = [c for c in live if c.pending == eval_id]
+
+            if not running or time.monotonic() >= deadline:
+                # Nobody is running this evaluation (yet, or any more since
+                # a worker died), or it is taking too long: give it to an
+                # idle worker as well.
+                idle = [c for c in live if c.pending is None]
+                if idle:
+                    if self.start(idle[0], eval_id, state, script, cwd):
+                        deadline = time.monotonic() + self.timeout
+                    continue
+                if not running:
+                    # All the workers are dead, or busy with previous
+                    # evaluations which took too long.
+                    return None
+                deadline = time.monotonic() + self.timeout
+
+            for key, _ in self.selector.select(max(0, deadline - time.monotonic())):
+                conn = key.data
+                try:
+                    messages = conn.receive()
+                except (OSError, ValueError) as e:
+                    self.drop(conn, e)
+                    continue
+                for message in messages:
+                    conn.pending = None
+                    if message["id"] == eval_id:
+                        return (message["status"], message["output"])
+
+
+class Worker(object):
+    """The worker side: keeps a copy of the workspace in workdir"""
+
+    def __init__(self, workdir):
+        self.workdir = os.path.abspath(workdir)
+        self.base = {}
+        self.current = {}
+
+        self.changed = set()
+        # The files modified since the last run of the predicate
+
+        self.previous = (None, None)
+        # The state id and the verdict of the last run of the predicate
+
+        fd, self.manifest = tempfile.mkstemp(
+            prefix="adareducer-changed-", suffix=".txt"
+        )
+        os.close(fd)
+
+    def update(self, target, blobs):
+        """Bring the copy of the workspace to the state target"""
+        for relative in set(self.current) | set(target):
+            digest = target.get(relative)
+            if self.current.get(relative) == digest:
+                continue
+            path = os.path.join(self.workdir, *relative.split("/"))
+            self.changed.add(path)
+            if digest is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(base64.b64decode(blobs[digest]))
+        self.current = dict(target)
+
+    def handle(self, message):
+        """Process one message, return the reply if any"""
+        if message["op"] == "base":
+            self.base = message["files"]
+            self.update(self.base, message["blobs"])
+            return None
+
+        target = dict(self.base)
+        target.update(message["files"])
+        self.update(target, message["blobs"])
+        cwd = os.path.join(self.workdir, *message["cwd"].split("/"))
+        script = os.path.join(self.workdir, *message["script"].split("/"))
+        os.chmod(script, os.stat(script).st_mode | 0o111)
+        env = predicate_environment(
+            sorted(self.changed),
+            self.manifest,
+            message["id"],
+            *self.previous,
+        )
+        self.changed = set()
+        status, output = run_script(script, cwd, env)
+        self.previous = (message["id"], status)
+        return {"id": message["id"], "status": status, "output": output}
+
+    def serve(self, address):
+        """Serve one coordinator at a time, forever"""
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(parse_address(address))
+        server.listen()
+        while True:
+            sock, peer = server.accept()
+            log(f"serving {peer[0]}:{peer[1]}")
+            self.current = {}
+            self.changed = set()
+            self.previous = (None, None)
+            try:
+                with sock, sock.makefile("rb") as stream:
+                    for line in stream:
+                        reply = self.handle(json.loads(line))
+                        if reply is not None:
+                            send_message(sock, reply)
+            except OSError as e:
+                log(f"connection lost: {e}")
+            log(f"done serving {peer[0]}:{peer[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run adareducer predicates.")
+    parser.add_argument(
+        "--listen", required=True, help="host:port to listen on, e.g. 127.0.0.1:7000"
+    )
+    parser.add_argument(
+        "--workdir", required=True, help="Where to keep the copy of the workspace."
+    )
+    args = parser.parse_args()
+    Worker(args.workdir).serve(args.listen)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,37 @@
-import subprocess
+import atexit
+import contextlib
 import os
 import sys
+import tempfile
+import time
 import libadalang as lal
 
-from ada_reducer.types import Buffer
-from ada_reducer.project_support import ProjectResolver
+from ada_reducer.types import BufferRegistry
+from ada_reducer.project_support import ProjectResolver, project_closure
+from ada_reducer.predicate import (
+    PredicateRequest,
+    call_predicate,
+    predicate_environment,
+    run_script,
+)
+from ada_reducer.workspace import Workspace, CHANGES
+from ada_reducer.distributed import WorkerPool
 from ada_reducer.gui import log, GUI
+from ada_reducer.stats import PredicateStats, RunStats
+from ada_reducer.ast_index import INDEXES
+from ada_reducer.dichotomy import to_forest, dichototree
+from ada_reducer.pipeline import Prefetcher
+from ada_reducer.scheduler import Budget, BudgetExhausted, Scheduler
+from ada_reducer.spec_analysis import spec_dependencies
+from ada_reducer.snapshots import SnapshotStore, default_run_dir
+from ada_reducer.priors import KIND_PRIORS
+from ada_reducer.contexts import ContextManager
 
 # Strategies
-from ada_reducer.delete_empty_units import DeleteEmptyUnits
+from ada_reducer.delete_empty_units import DeleteEmptyUnits, looks_empty
 from ada_reducer.hollow_body import HollowOutSubprograms
 from ada_reducer.remove_statement import RemoveStatements
+from ada_reducer.truncate_lists import TruncateLists
 from ada_reducer.remove_subprograms import RemoveSubprograms
 from ada_reducer.remove_imports import RemoveImports
 from ada_reducer.remove_trivias import RemoveTrivias
@@ -29,6 +50,7 @@ REMOVE_TABS = True
 EMPTY_OUT_BODIES_BRUTE_FORCE = True
 REMOVE_PACKAGES = True
 REMOVE_ASPECTS = True
+TRUNCATE_LISTS = True
 EMPTY_OUT_BODIES_STATEMENTS = True
 REMOVE_SUBPROGRAMS = True
 REMOVE_IMPORTS = True
@@ -36,6 +58,9 @@ REMOVE_TRIVIAS = True
 ATTEMPT_DELETE = True
 BRUTEFORCE_DELETE = True
 
+# Parse the next file in the background while the predicate runs
+PREFETCH = True
+
 # In cautious mode, run the predicate after running each file as a sanity check
 CAUTIOUS_MODE = True
 CAUTIOUS_MODE_HELP = """adareducer has found that the predicate no longer applies
@@ -50,6 +75,16 @@ If you are using "gprbuild" in your predicate, make sure to pass "-m2".
 """
 
 
+def new_manifest():
+    """Return a new temporary file, removed at exit, for the list of the
+    files changed since the previous run of a predicate.
+    """
+    fd, path = tempfile.mkstemp(prefix="adareducer-changed-", suffix=".txt")
+    os.close(fd)
+    atexit.register(os.remove, path)
+    return path
+
+
 class StrategyStats(object):
     def __init__(self, characters_removed, time):
         self.characters_removed = characters_removed
@@ -57,37 +92,319 @@ class StrategyStats(object):
 
 
 class Reducer(object):
-    def __init__(self, project_file, script, single_file=None, follow_closure=False):
+    def __init__(
+        self,
+        project_file,
+        script,
+        single_file=None,
+        follow_closure=False,
+        cache_dir=None,
+        timing=False,
+        workers=None,
+        worker_timeout=120,
+        project_wide=False,
+        budget=None,
+        jobs=1,
+        run_dir=None,
+        priors_file=None,
+        fast_script=None,
+        max_units=None,
+        max_rss=None,
+        slots=None,
+    ):
         self.project_file = project_file
         self.script = script
-        self.resolver = ProjectResolver(project_file)
+        self.fast_script = fast_script  # Run before script, see run_predicate
+        # script and fast_script are paths, or functions taking a
+        # PredicateRequest, see run_locally
+        self.listeners = []  # See add_listener
+        self.slots = slots  # A batch.SlotClient, to run the predicates in batch mode
+        self.predicate_stats = PredicateStats()
+        self.timing = timing  # Whether to log the startup time breakdown
+        self.stats = RunStats()
+        self.resolver = ProjectResolver(project_file, cache_dir, self.stats)
         self.single_file = single_file
         self.follow_closure = follow_closure
         self.overzealous_mode = False  # Whether to keep trying as long as we reduce
-
-        self.unit_provider = lal.UnitProvider.for_project(os.path.abspath(project_file))
-        self.context = lal.AnalysisContext(unit_provider=self.unit_provider)
+        self.project_wide = project_wide  # Whether to run each strategy once
+        self.budget = budget if budget is not None else Budget()
+        self.budget.files = list(self.resolver.files.values())
+        self.jobs = jobs  # Processes to use for the analysis of specs
+
+        # The history of the reduction, see snapshots.py
+        self.snapshots = SnapshotStore(run_dir or default_run_dir())
+
+        # What is learned about the kinds of chunks which can be removed
+        # is kept across runs in priors_file, see priors.py
+        if priors_file is not None:
+            KIND_PRIORS.load(priors_file)
+            atexit.register(KIND_PRIORS.save, priors_file)
+
+        # The unit provider and the analysis contexts are only created in
+        # run(), so that loading the project view overlaps with the initial
+        # run of the predicate.
+        self.unit_provider = None
+        self.contexts = None
+        self.prefetcher = None
+        self.max_units = max_units
+        self.max_rss = max_rss
+        # The limits on the size of the analysis context, see contexts.py
+
+        # The buffers of the files being reduced, used by all the
+        # strategies, and written before running the predicate
+        self.buffers = BufferRegistry()
+
+        self.modified = CHANGES.watch()
+        # The files modified since the analysis context last saw them,
+        # see refresh_context
+
+        # What the predicate is told about its previous run, see
+        # predicate_environment
+        self.state_id = 0
+        self.previous_state_id = None
+        self.previous_verdict = None
+        self.manifest = None
+        self.changed_files = set()
+        # The files changed since the previous run of the predicate
+
+        # Likewise for the fast predicate
+        self.fast_previous = (None, None)
+        self.fast_manifest = None
+
+        # The digests of the files which the predicate may depend on, the
+        # last time it passed, see record_known_good
+        self.known_good = None
+        self.known_good_workspace = None
+        self.unverified = CHANGES.watch()
+        # The files modified since the predicate last passed
+
+        # Predicate workers, see distributed.py
+        self.workers = None
+        if workers:
+            if callable(script):
+                raise ValueError("predicate functions cannot run on workers")
+            self.workers = WorkerPool(workers, self.workspace(), worker_timeout)
 
         self.mains_to_reduce = set()
         self.bodies_to_reduce = []  # bodies to reduce
         self.ads_dict = {}  # specs to reduce
         self.files_reduced = set()  # Files already reduced
 
+    def reset_context(self):
+        """Start over with a fresh analysis context, to see the
+        latest version of the sources.
+        """
+        self.buffers.flush()
+        self.wait_for_prefetch()
+        self.contexts.reset()
+        self.modified.clear()
+        INDEXES.invalidate()
+
+    def refresh_context(self):
+        """Make the analysis context see the latest version of the sources.
+
+        Only the units of the files modified since the context last saw
+        them are parsed again: the indexes of the others remain valid.
+        """
+        self.buffers.flush()
+        self.wait_for_prefetch()
+        modified = sorted(self.modified)
+        self.modified.clear()
+        self.contexts.refresh(modified)
+        for file in modified:
+            INDEXES.invalidate(file)
+
+    @property
+    def context(self):
+        """The current analysis context"""
+        self.wait_for_prefetch()
+        return self.contexts.context
+
+    def wait_for_prefetch(self):
+        """Wait until the next file is prefetched, if it is being prefetched.
+
+        Libadalang is not thread-safe: this must be called before using
+        it in the main thread.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.wait()
+
+    def workspace(self):
+        """Return the Workspace containing the files the predicate may
+        depend on: the sources, the project files, and the files next to
+        the predicate script.
+        """
+        files = set(self.resolver.dependency_files)
+        files.update(project_closure(self.project_file))
+        if not callable(self.script):
+            script_dir = os.path.dirname(os.path.abspath(self.script))
+            for name in os.listdir(script_dir):
+                path = os.path.join(script_dir, name)
+                if os.path.isfile(path):
+                    files.add(path)
+        return Workspace(files, root=os.path.commonpath(list(files) + [os.getcwd()]))
+
     def run_predicate(self, print_if_error=False):
-        """Run predicate and return True iff predicate returned 0."""
-        if self.script.endswith(".sh"):
-            cmd = ["bash", self.script]
-        elif self.script.endswith(".ps1"):
-            cmd = ["powershell", "-File", self.script]
-        else:
-            cmd = [self.script]
+        """Run predicate and return True iff predicate returned 0.
+
+        Once the budget is exhausted, raise BudgetExhausted without running
+        it: no further modification is kept, and the reduction stops.
+
+        If there is a fast predicate, it is run first, and the predicate is
+        only run if it passes.
+        """
+        self.buffers.flush()
+        if self.budget.exhausted():
+            KIND_PRIORS.verdict(None)
+            raise BudgetExhausted()
+
+        self.state_id += 1
+        changed_files = CHANGES.take()
+        self.changed_files.update(changed_files)
+
+        if self.fast_script is not None:
+            status, output = self.run_fast_predicate(changed_files)
+            if not status:
+                KIND_PRIORS.verdict(None)
+                if print_if_error:
+                    log("The fast predicate returned nonzero")
+                    log(output)
+                return False
+
+        self.budget.calls += 1
+        changed_files = sorted(self.changed_files)
+        self.changed_files = set()
+        start = time.perf_counter()
+
+        result = None
+        if self.workers is not None:
+            result = self.workers.evaluate(self.script, os.getcwd(), self.state_id)
+            if result is None:
+                log("no predicate worker available, running locally")
+        if result is None:
+            if self.manifest is None:
+                self.manifest = new_manifest()
+            result = self.run_locally(
+                self.script,
+                changed_files,
+                self.manifest,
+                (self.previous_state_id, self.previous_verdict),
+            )
 
-        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        status = out.returncode == 0
+        status, output = result
+        KIND_PRIORS.verdict(status)
+        self.predicate_stats.full_runs += 1
+        self.predicate_stats.full_time += time.perf_counter() - start
+        self.previous_state_id = self.state_id
+        self.previous_verdict = status
+        if status:
+            self.budget.accepted()
+        if CAUTIOUS_MODE and status:
+            self.record_known_good()
         if print_if_error and not status:
-            log(out.stdout.decode() + "\n" + out.stderr.decode())
+            log(output)
+        self.emit("predicate", state_id=self.state_id, verdict=status)
         return status
 
+    def run_locally(self, script, changed_files, manifest, previous):
+        """Run script, a path or a function, in this process or in a child,
+        telling it about the files changed since its previous run.
+
+        previous is (state id, verdict) for the previous run.
+        Return a tuple (True iff it passed, its output).
+        """
+        with self.slot():
+            if callable(script):
+                # The predicate may use libadalang
+                self.wait_for_prefetch()
+                request = PredicateRequest(changed_files, self.state_id, *previous)
+                return call_predicate(script, request)
+            env = predicate_environment(
+                changed_files, manifest, self.state_id, *previous
+            )
+            return run_script(script, env=env)
+
+    def emit(self, event, **details):
+        """Tell the listeners about event, see add_listener"""
+        for listener in self.listeners:
+            listener(event, details)
+
+    def add_listener(self, listener):
+        """Call listener(event, details) on the progress of the reduction.
+        listener must not use libadalang, see wait_for_prefetch.
+
+        The events, with the keys of details, are:
+           "predicate" (state_id, verdict): the predicate ran
+           "step" (step, file): a step of the reduction starts, file
+              is None when it applies to the whole project
+           "file" (file, characters_removed): done reducing a file
+           "done" (): the reduction is over
+        """
+        self.listeners.append(listener)
+
+    def slot(self):
+        """Return a context manager during which a predicate may run"""
+        if self.slots is None:
+            return contextlib.nullcontext()
+        return self.slots.slot()
+
+    def run_fast_predicate(self, changed_files):
+        """Run the fast predicate locally, return (True iff it returned 0,
+        its output). changed_files are the files changed since its
+        previous run.
+        """
+        if self.fast_manifest is None:
+            self.fast_manifest = new_manifest()
+        start = time.perf_counter()
+        status, output = self.run_locally(
+            self.fast_script, changed_files, self.fast_manifest, self.fast_previous
+        )
+        self.predicate_stats.fast_time += time.perf_counter() - start
+        self.predicate_stats.fast_runs += 1
+        if not status:
+            self.predicate_stats.fast_failures += 1
+        self.fast_previous = (self.state_id, status)
+        return (status, output)
+
+    def record_known_good(self):
+        """Record the state of the files, on which the predicate passed.
+
+        Only the first time are all the files which the predicate may
+        depend on hashed: then only those modified since, which includes
+        the files created, renamed or deleted, see CHANGES.
+        """
+        if self.known_good is None:
+            if self.workers is not None:
+                self.known_good_workspace = self.workers.workspace
+            else:
+                self.known_good_workspace = self.workspace()
+            workspace = self.known_good_workspace
+            self.known_good = {f: workspace.digest(f) for f in workspace.files}
+        for f in self.unverified:
+            self.known_good[f] = self.known_good_workspace.digest(f)
+        self.unverified.clear()
+
+    def is_known_good(self):
+        """Return True iff the files are as they were the last time the
+        predicate passed, see record_known_good.
+        """
+        if self.known_good is None:
+            return False
+        # Not only the files modified by the reducer: they may have been
+        # edited by something else
+        workspace = self.known_good_workspace
+        files = self.unverified.union(workspace.files)
+        return all(workspace.digest(f) == self.known_good.get(f) for f in files)
+
+    def check_predicate(self):
+        """Run the predicate as a sanity check, unless the sources did not
+        change since the last time it passed. Return True iff it passes.
+        """
+        if self.is_known_good():
+            log("   sanity check skipped: no change since the predicate passed")
+            return True
+        return self.run_predicate()
+
     def attempt_delete_all(self, files):
         """attempt pretend-deletion of all files in files by appending
         '.deleted' to the file name
@@ -96,24 +413,43 @@ class Reducer(object):
         def pretend_deletion(name):
             return f"{file}.deleted"
 
+        self.buffers.flush()
         for file in files:
+            self.buffers.pop(file, None)
             os.rename(file, pretend_deletion(file))
-        if not self.run_predicate():
-            for file in files:
-                os.rename(pretend_deletion(file), file)
+            CHANGES.add(file)
+        passed = False
+        try:
+            passed = self.run_predicate()
+        finally:
+            # See BudgetExhausted
+            if not passed:
+                for file in files:
+                    os.rename(pretend_deletion(file), file)
+                    CHANGES.add(file)
+        if not passed:
             if len(files) > 1:
                 self.attempt_delete_all(files[: len(files) // 2])
                 self.attempt_delete_all(files[len(files) // 2 :])
 
     def attempt_delete(self, file):
         """attempt deletion of f"""
-        buf = Buffer(file)
+        self.buffers.flush()
+        buf = self.buffers[file]
+        del self.buffers[file]
         os.remove(file)
-        if self.run_predicate():
+        CHANGES.add(file)
+        passed = False
+        try:
+            passed = self.run_predicate()
+        finally:
+            if not passed:
+                # put the file back
+                buf.save()
+                self.buffers[file] = buf
+        if passed:
             log("... yay, deleted \o/")
         else:
-            # put the file back
-            buf.save()
             log("... didn't work.")
 
     def sort_ads_files(self):
@@ -131,30 +467,19 @@ class Reducer(object):
             if full.endswith(".ads") and os.path.exists(full):
                 ads_dict[full] = set()
 
-        # Now iterate on all of them
-        total = len(ads_dict)
-        count = 0
-        for x in ads_dict:
-            count += 1
-            log(f"\t{count}/{total}: analyzing {x}")
-            unit = self.context.get_from_file(x)
-
-            # Iterate on all the use clauses
-            root = unit.root
-            if root is None:
+        # Now analyze all of them
+        log(f"\tanalyzing {len(ads_dict)} specs")
+        dependencies = spec_dependencies(
+            list(ads_dict), self.contexts, self.project_file, self.jobs
+        )
+        for x, withed in dependencies.items():
+            if withed is None:
                 log(f"??? cannot find a root node for {x}")
                 self.attempt_delete(x)
             else:
-                for w in root.findall(lambda x: x.is_a(lal.WithClause)):
-                    if not w.children[0].is_a(lal.LimitedPresent):
-                        # find the last id in w
-                        ids = w.findall(lambda x: x.is_a(lal.Identifier))
-                        if ids is not None:
-                            id = ids[-1]
-                            decl = id.p_referenced_defining_name()
-                            if decl is not None:
-                                if decl.unit.filename in ads_dict:
-                                    ads_dict[decl.unit.filename].add(x)
+                for w in withed:
+                    if w in ads_dict:
+                        ads_dict[w].add(x)
 
         self.ads_dict = ads_dict
 
@@ -184,10 +509,15 @@ class Reducer(object):
                     self.ads_dict[x].remove(file)
             self.ads_dict.pop(file)
 
-    def next_file_to_process(self):
-        """Return the next file to process, None if we're done"""
+    def next_file_to_process(self, peek=False):
+        """Return the next file to process, None if we're done.
+        If peek, only predict it, without updating the lists of files.
+        """
         if len(self.mains_to_reduce) > 0:
-            return self.mains_to_reduce.pop()
+            file = next(iter(self.mains_to_reduce))
+            if not peek:
+                self.mains_to_reduce.remove(file)
+            return file
 
         if len(self.ads_dict) == 0:
             if len(self.bodies_to_reduce) == 0:
@@ -206,6 +536,8 @@ class Reducer(object):
                         return bod
                     return candidate
             # if we reach here, there might be an issue
+            if peek:
+                return None
             log("circular dependency left over")
             for c in self.ads_dict:
                 print(c)
@@ -216,23 +548,92 @@ class Reducer(object):
 
     def run(self):
         """Run self: reduce the project as much as possible"""
+        try:
+            self.reduce()
+        finally:
+            # Don't keep following the files modified by other reductions
+            CHANGES.unwatch(self.modified)
+            CHANGES.unwatch(self.unverified)
+            self.snapshots.close()
+        if self.fast_script is not None:
+            log(self.predicate_stats.report())
+        if self.contexts is not None:
+            log(self.contexts.report())
+        self.emit("done")
+
+    def reduce(self):
+        """Reduce the project as much as possible, see run()"""
+
+        if self.budget.exhausted():
+            log("Nothing to do: the budget is exhausted already")
+            return
+
+        if not any(callable(s) for s in (self.script, self.fast_script)):
+            # A predicate function may use libadalang, which must not run
+            # in two threads at once: only overlap with predicate scripts
+            self.resolver.start_loading_unit_provider()
 
         # Before running any modification, run the predicate,
         # as a sanity check.
-        if not self.run_predicate(True):
+        with self.stats.time("initial predicate run"):
+            predicate_ok = self.run_predicate(True)
+        if not predicate_ok:
             log("The predicate returned nonzero")
+            if self.timing:
+                log(self.stats.report("Startup time"))
             return
 
+        log(f"Recording the history of the reduction in {self.snapshots.run_dir}")
+        self.snapshots.record("start", self.budget.files)
+
+        self.unit_provider = self.resolver.unit_provider()
+        self.contexts = ContextManager(
+            self.unit_provider,
+            self.max_units,
+            self.max_rss,
+            self.resolver.dependency_files,
+        )
+        if PREFETCH:
+            self.prefetcher = Prefetcher(self.unit_provider)
+
         # We've passed the sanity check, time to reduce!
+        try:
+            self.reduce_sources()
+        except BudgetExhausted:
+            # The modification being tried was undone
+            self.buffers.flush()
+            self.snapshots.record("budget exhausted")
+            log(f"Stopping: budget exhausted after {self.budget.calls} predicate runs")
+
+    def reduce_sources(self):
+        """See reduce"""
 
         # Attempt to remove all files in the project before doing any
         # reduction: this might save time by deleting files we would have tried
         # to reduce.
         if BRUTEFORCE_DELETE:
             log("=> Removing any unused files")
-            self.attempt_delete_all(
-                [self.resolver.files[name] for name in self.resolver.files]
-            )
+            with self.stats.time("remove unused files"):
+                self.attempt_delete_all(
+                    [self.resolver.files[name] for name in self.resolver.files]
+                )
+            self.snapshots.record("remove unused files")
+
+        if self.project_wide:
+            if self.timing:
+                log(self.stats.report("Startup time"))
+            self.reduce_project()
+            return
+
+        if self.budget.limited():
+            # Spend the budget where it is expected to remove the most
+            if self.timing:
+                log(self.stats.report("Startup time"))
+            if self.single_file:
+                self.reduce_scheduled([self.single_file])
+            else:
+                self.reduce_scheduled(self.files_to_reduce())
+            return
 
         # Prepare the list of files to reduce. First the main file.
         if self.single_file:
@@ -252,104 +653,183 @@ class Reducer(object):
                     self.bodies_to_reduce.append(self.resolver.files[x])
 
             # Add all the specs
-            self.sort_ads_files()
+            with self.stats.time("sort specs"):
+                self.sort_ads_files()
 
             candidate = self.next_file_to_process()
 
+        if self.timing:
+            log(self.stats.report("Startup time"))
+
         while candidate is not None:
             self.reduce_file(candidate)
             candidate = self.next_file_to_process()
 
-    def apply_strategies_on_file(self, file, buf) -> int:
-        """Apply all the strategies on the given buf.
-
-        Return the number of characters removed.
-        """
+    def strip_tabs(self, file, buf):
+        """Remove the tabs from buf"""
+        log("=> Removing tabs")
+        orig = buf.lines
         count = buf.count_chars()
+        buf.strip_tabs()
+        buf.save()
+        if CAUTIOUS_MODE and buf.count_chars() < count:
+            # In cautious mode, if we actually did
+            # remove some tabs, run the predicate as a check.
+            try:
+                passed = self.run_predicate()
+            except BudgetExhausted:
+                buf.lines = orig
+                buf.save()
+                raise
+            if not passed:
+                log(f"The issue is gone after stripping TABs in {file}")
+                log("adareducer cannot help in this case.")
+                sys.exit(1)
 
-        if REMOVE_TABS:
-            log("=> Removing tabs")
-            buf.strip_tabs()
-            if CAUTIOUS_MODE and buf.count_chars() < count:
-                # In cautious mode, if we actually did
-                # remove some tabs, run the predicate as a check.
-                if not self.run_predicate():
-                    log(f"The issue is gone after stripping TABs in {file}")
-                    log("adareducer cannot help in this case.")
-                    sys.exit(1)
-
-        unit = self.context.get_from_file(file)
-
-        if unit is None or unit.root is None:
-            log(f"??? cannot find a root node for {file}")
-            self.attempt_delete(file)
-            return 0
-
-
-        if EMPTY_OUT_BODIES_BRUTE_FORCE:
-            log("=> Emptying out bodies (brute force)")
-
+    def steps(self):
+        """Return the list of (step, title) to run on each file, in order"""
+        steps = [
+            (
+                EMPTY_OUT_BODIES_BRUTE_FORCE,
+                "hollow",
+                "Emptying out bodies (brute force)",
+            ),
+            (TRUNCATE_LISTS, "truncate", "Truncating long lists"),
+            (
+                EMPTY_OUT_BODIES_STATEMENTS,
+                "statements",
+                "Emptying out bodies (statement by statement)",
+            ),
+            (REMOVE_ASPECTS, "aspects", "Removing aspects"),
+            (REMOVE_SUBPROGRAMS, "subprograms", "Removing subprograms"),
+            (REMOVE_PACKAGES, "packages", "Removing packages"),
+            (REMOVE_IMPORTS, "imports", "Removing imports"),
+            (REMOVE_TRIVIAS, "trivias", "Removing blank lines and comments"),
+            (ATTEMPT_DELETE, "delete", "Attempting to delete"),
+        ]
+        return [(step, title) for enabled, step, title in steps if enabled]
+
+    def run_step(self, step, file, unit=None):
+        """Run one step of the reduction of file, see steps().
+
+        unit, if not None, is the up to date unit for file in self.context.
+        Return True iff the step deleted the file.
+        """
+        self.emit("step", step=step, file=file)
+        if step != "trivias":
+            # See wait_for_prefetch
+            self.wait_for_prefetch()
+        if step in ("trivias", "delete"):
+            # These don't need the unit
+            pass
+        elif unit is None:
+            self.refresh_context()
+            unit = self.contexts.get_from_file(file)
+
+        # Only the buffers the strategy uses are part of its snapshots
+        buffers = self.buffers.view()
+        deleted = False
+        if step == "hollow":
             HollowOutSubprograms().run_on_file(
-                unit, buf.lines, self.run_predicate, lambda: buf.save()
+                unit, buffers[file], self.run_predicate, buffers.save
             )
 
-        # If there are bodies left, remove statements from them
+        elif step == "truncate":
+            # Clear large parts of long lists of statements and declarations
+            TruncateLists().run_on_file(
+                unit, buffers[file], self.run_predicate, buffers.save
+            )
 
-        if EMPTY_OUT_BODIES_STATEMENTS:
-            self.context = lal.AnalysisContext(unit_provider=self.unit_provider)
-            log("=> Emptying out bodies (statement by statement)")
-            buf = Buffer(file)
-            unit = self.context.get_from_file(file)
+        elif step == "statements":
+            # If there are bodies left, remove statements from them
             RemoveStatements().run_on_file(
-                unit, buf.lines, self.run_predicate, lambda: buf.save()
+                unit, buffers[file], self.run_predicate, buffers.save
             )
 
-        # Let's try removing aspects
-
-        if REMOVE_ASPECTS:
-            self.context = lal.AnalysisContext(unit_provider=self.unit_provider)
-            log("=> Removing aspects")
-            RemoveAspects().run_on_file(self.context, file, self.run_predicate)
-
-        # Remove subprograms
+        elif step == "aspects":
+            RemoveAspects().run_on_file(
+                self.context, file, self.run_predicate, buffers
+            )
 
-        if REMOVE_SUBPROGRAMS:
-            self.context = lal.AnalysisContext(unit_provider=self.unit_provider)
-            log("=> Removing subprograms")
+        elif step == "subprograms":
             try:
-                RemoveSubprograms().run_on_file(self.context, file, self.run_predicate)
+                RemoveSubprograms().run_on_file(
+                    self.context, file, self.run_predicate, buffers
+                )
             except lal.PropertyError:
                 # retry with a new context...
-                self.context = lal.AnalysisContext(unit_provider=self.unit_provider)
-                RemoveSubprograms().run_on_file(self.context, file, self.run_predicate)
+                self.reset_context()
+                RemoveSubprograms().run_on_file(
+                    self.context, file, self.run_predicate, buffers
+                )
+
+        elif step == "packages":
+            RemovePackages().run_on_file(
+                self.context, file, self.run_predicate, buffers
+            )
 
-        # Let's try removing packages
+        elif step == "imports":
+            # Remove the imports that we can remove
+            RemoveImports().run_on_file(
+                self.context, file, self.run_predicate, buffers
+            )
 
-        if REMOVE_PACKAGES:
-            self.context = lal.AnalysisContext(unit_provider=self.unit_provider)
-            log("=> Removing packages")
-            RemovePackages().run_on_file(self.context, file, self.run_predicate)
+        elif step == "trivias":
+            RemoveTrivias().run_on_file(file, self.run_predicate, buffers)
 
-        # Next remove the imports that we can remove
+        elif step == "delete":
+            # Attempt to delete the file if it's empty-ish
+            # This removes the buffer of the file from the registry
+            deleted = DeleteEmptyUnits().run_on_file(
+                self.context, file, self.run_predicate, self.buffers
+            )
 
-        if REMOVE_IMPORTS:
-            log("=> Removing imports")
-            RemoveImports().run_on_file(self.context, file, self.run_predicate)
+        # Leave the files as the strategy left their buffers
+        self.buffers.flush()
+        return deleted
 
-        # Remove trivias
+    def apply_strategies_on_file(self, file, buf) -> int:
+        """Apply all the strategies on the given buf.
 
-        if REMOVE_TRIVIAS:
-            log("=> Removing blank lines and comments")
-            RemoveTrivias().run_on_file(file, self.run_predicate)
+        Return the number of characters removed.
+        """
+        count = buf.count_chars()
+
+        if REMOVE_TABS:
+            self.strip_tabs(file, buf)
+
+        # Start from a fresh context, parsed in the background already
+        # if the file was prefetched.
+        prefetched = None
+        if self.prefetcher is not None:
+            prefetched = self.prefetcher.take(file)
+        if prefetched is not None:
+            context, unit, index = prefetched
+            self.contexts.adopt(context, [file])
+            INDEXES.adopt(context, index)
+        else:
+            self.reset_context()
+            unit = self.contexts.get_from_file(file)
 
-        # Attempt to delete the file if it's empty-ish
+        if unit is None or unit.root is None:
+            log(f"??? cannot find a root node for {file}")
+            self.attempt_delete(file)
+            return 0
 
         deletion_successful = False
-        if ATTEMPT_DELETE:
-            log("=> Attempting to delete")
-            deletion_successful = DeleteEmptyUnits().run_on_file(
-                self.context, file, self.run_predicate
-            )
+        for step, title in self.steps():
+            if step == "trivias" and self.prefetcher is not None:
+                # The only step which does not use libadalang: parse the
+                # next file while it runs the predicate, see run_step
+                next_file = self.next_file_to_process(peek=True)
+                if next_file is not None and next_file != file:
+                    self.prefetcher.start(next_file)
+
+            log(f"=> {title}")
+            if self.run_step(step, file, unit):
+                deletion_successful = True
+            unit = None  # The next steps parse the file again
+            self.snapshots.record(f"{step} on {file}")
 
         # Fin
 
@@ -357,11 +837,195 @@ class Reducer(object):
             log("   File deleted! \o/")
             chars_removed = count
         else:
-            buf = Buffer(file)
-            chars_removed = count - buf.count_chars()
+            chars_removed = count - self.buffers[file].count_chars()
 
         return chars_removed
 
+    def files_to_reduce(self):
+        """Return the list of files of the project which can be reduced"""
+        result = []
+        for name in sorted(self.resolver.files):
+            file = self.resolver.files[name]
+            if not os.path.exists(file):
+                continue
+            if "rts-" in file:
+                log(f"SKIPPING {file}: looks like a runtime file")
+            elif not os.access(file, os.W_OK):
+                log(f"SKIPPING {file}: not writable")
+            else:
+                result.append(file)
+        return result
+
+    def run_strategy_on_project(self, strategy, files):
+        """Gather the chunks of strategy for all files into a single tree,
+        and dichotomize it: files are attempted as a whole first.
+
+        The chunks of two files can only be ordered safely if each edits
+        its own file: otherwise, the files are processed one at a time.
+        """
+        if strategy.edits_other_files:
+            for file in files:
+                self.run_strategy_on_files(strategy, [file])
+        else:
+            self.run_strategy_on_files(strategy, files)
+
+    def run_strategy_on_files(self, strategy, files):
+        """See run_strategy_on_project"""
+        self.refresh_context()
+        buffers = self.buffers.view()
+        chunks_by_file = []
+        for file in files:
+            if not os.path.exists(file):
+                continue
+            unit = self.contexts.get_from_file(file)
+            if unit.root is None:
+                log(f"??? cannot find a root node for {file}")
+                continue
+            try:
+                chunks_by_file.append((file, strategy.chunks(unit, file, buffers)))
+            except lal.PropertyError as e:
+                log(f"SKIPPING {file}: {e}")
+        tree = to_forest(chunks_by_file)
+        dichototree(tree, self.run_predicate, buffers.save, buffers.snapshot)
+        self.buffers.flush()
+
+    def reduce_project(self):
+        """Reduce all the files at once, running each strategy on the
+        whole project.
+        """
+        files = self.files_to_reduce()
+        buffers = self.buffers
+        count = 0
+        for file in files:
+            count += buffers[file].count_chars()
+
+        if REMOVE_TABS:
+            log("=> Removing tabs")
+            self.emit("step", step="tabs", file=None)
+            before = buffers.snapshot()
+            for file in files:
+                buffers[file].strip_tabs()
+            buffers.flush()
+            if CAUTIOUS_MODE and sum(buffers[f].count_chars() for f in files) < count:
+                try:
+                    passed = self.run_predicate()
+                except BudgetExhausted:
+                    before.restore()
+                    raise
+                if not passed:
+                    log("The issue is gone after stripping TABs")
+                    log("adareducer cannot help in this case.")
+                    sys.exit(1)
+            self.snapshots.record("tabs")
+
+        if EMPTY_OUT_BODIES_BRUTE_FORCE:
+            log("=> Emptying out bodies (whole project)")
+            self.emit("step", step="hollow", file=None)
+            self.run_strategy_on_project(HollowOutSubprograms(), files)
+            self.snapshots.record("hollow")
+
+        if TRUNCATE_LISTS:
+            # This only edits each file itself, so all the files can be
+            # processed with the same context.
+            log("=> Truncating long lists")
+            self.emit("step", step="truncate", file=None)
+            self.refresh_context()
+            for file in files:
+                if os.path.exists(file):
+                    unit = self.contexts.get_from_file(file)
+                    TruncateLists().run_on_file(
+                        unit, buffers[file], self.run_predicate, buffers.save
+                    )
+            buffers.flush()
+            self.snapshots.record("truncate")
+
+        strategies = [
+            (
+                EMPTY_OUT_BODIES_STATEMENTS,
+                "statements",
+                "Removing statements",
+                RemoveStatements,
+            ),
+            (REMOVE_ASPECTS, "aspects", "Removing aspects", RemoveAspects),
+            (
+                REMOVE_SUBPROGRAMS,
+                "subprograms",
+                "Removing subprograms",
+                RemoveSubprograms,
+            ),
+            (REMOVE_PACKAGES, "packages", "Removing packages", RemovePackages),
+            (REMOVE_IMPORTS, "imports", "Removing imports", RemoveImports),
+            (
+                REMOVE_TRIVIAS,
+                "trivias",
+                "Removing blank lines and comments",
+                RemoveTrivias,
+            ),
+        ]
+        for enabled, step, title, strategy in strategies:
+            if enabled:
+                log(f"=> {title} (whole project)")
+                self.emit("step", step=step, file=None)
+                self.run_strategy_on_project(strategy(), files)
+                self.snapshots.record(title)
+
+        if ATTEMPT_DELETE:
+            log("=> Attempting to delete")
+            self.emit("step", step="delete", file=None)
+            self.attempt_delete_all(
+                [f for f in files if os.path.exists(f) and looks_empty(buffers[f])]
+            )
+            self.snapshots.record("delete")
+
+        remaining = sum(buffers[f].count_chars() for f in files if os.path.exists(f))
+        log(f"done reducing the project ({count - remaining} characters removed)")
+        GUI.add_chars_removed(count - remaining)
+
+        if CAUTIOUS_MODE and not self.budget.exhausted():
+            if not self.check_predicate():
+                log(CAUTIOUS_MODE_HELP)
+                sys.exit(1)
+
+    def reduce_scheduled(self, files):
+        """Reduce files until the budget is exhausted, running first the
+        steps which are expected to remove the most per predicate run.
+        """
+        steps = self.steps()
+        titles = dict(steps)
+        scheduler = Scheduler(files, [step for step, _ in steps])
+        started = set()
+
+        while not self.budget.exhausted():
+            task = scheduler.next_task()
+            if task is None:
+                break
+            file, step = task
+
+            if file not in started:
+                started.add(file)
+                log(f"*** Reducing {file}")
+                if REMOVE_TABS:
+                    self.strip_tabs(file, self.buffers[file])
+
+            size = os.path.getsize(file)
+            total = self.budget.size()
+            calls = self.budget.calls
+            log(f"=> {titles[step]} in {file}")
+            try:
+                self.run_step(step, file)
+            except lal.PropertyError as e:
+                log(f"??? {step} failed on {file}: {e}")
+            self.snapshots.record(f"{step} on {file}")
+            removed = total - self.budget.size()
+            scheduler.done(file, step, size, removed, self.budget.calls - calls)
+            GUI.add_chars_removed(removed)
+            # The next task may be on any file: only keep the files in
+            # memory during a step
+            self.buffers.evict()
+
+        if self.budget.exhausted():
+            log(f"Stopping: budget exhausted after {self.budget.calls} predicate runs")
+
     def reduce_file(self, file):
         """Reduce one given file as much as possible"""
 
@@ -377,32 +1041,37 @@ class Reducer(object):
 
         log(f"*** Reducing {file}")
 
-        # Save the file to an '.orig' copy
-        buf = Buffer(file)
-        buf.save(file + ".orig")
+        # The original contents are in the snapshot store since the start
+        buf = self.buffers[file]
 
         try:
             chars_removed = self.apply_strategies_on_file(file, buf)
+        except BudgetExhausted:
+            raise
         except:
             # Catch any exception occurring during the application of
-            # strategies, and save the buf to a .crash file, to
+            # strategies, and record the state of the file, to
             # help post-mortem analysis.
             chars_removed = 0
-            buf.save(file + ".crash")
+            self.snapshots.record(f"crash in {file}", [file])
             raise
 
         # Print some stats
 
         log(f"done reducing {file} ({chars_removed} characters removed)")
+        self.emit("file", file=file, characters_removed=chars_removed)
         GUI.add_chars_removed(chars_removed)
 
         # Cautious?
 
         if CAUTIOUS_MODE:
-            if not self.run_predicate():
+            if not self.check_predicate():
                 log(CAUTIOUS_MODE_HELP)
                 sys.exit(1)
 
+        # Don't keep the files which are done in memory
+        self.buffers.evict()
+
         # Move on to the next files
 
         if self.follow_closure:
@@ -414,8 +1083,8 @@ class Reducer(object):
                     self.ads_dict[ads] = []
                     return
 
-            self.context = lal.AnalysisContext(unit_provider=self.unit_provider)
-            unit = self.context.get_from_file(file)
+            self.refresh_context()
+            unit = self.contexts.get_from_file(file)
             root = unit.root
             if root is not None:
                 # Iterate through all "with" statements
@@ -1,33 +1,31 @@
 import libadalang as lal
-from ada_reducer.types import replace, infer_or_equal
+from ada_reducer.types import BufferSet, sloc_of, to_sloc_range
 from ada_reducer.interfaces import ChunkInterface, StrategyInterface
 from ada_reducer.dichotomy import to_tree, dichototree
+from ada_reducer.ast_index import index_of
 
 
 class HollowBody(ChunkInterface):
-    def __init__(self, unit, lines, node):
-        """node is a lal.SubpBody. Hollow it out."""
-        self.unit = unit
-        self.lines = lines
-        self.node = node
-
-        self.spec = self.node.find(lal.SubpSpec)
-        self.decl = self.node.find(lal.DeclarativePart).find(lal.AdaNodeList)
-        handled = self.node.find(lal.HandledStmts)
-        if handled is not None:
-            self.statements = handled.find(lal.StmtList)
-        else:
-            self.statements = None
-
-        self.statements_lines = None
-        self.statements_range = None
-        self.decl_range = None
-        self.decl_lines = None
-
-    def do(self):
-        if not self.statements:
+    __slots__ = ("buffer", "start", "end", "kind", "edits")
+
+    def __init__(self, buffer, node, sloc):
+        """node is a lal.SubpBody, sloc its sloc tuple. Hollow it out."""
+        self.buffer = buffer
+        self.start = sloc[0:2]
+        self.end = sloc[2:4]
+        self.kind = type(node).__name__
+
+        self.edits = []
+        # The list of (range, replacement lines) to apply, in order
+
+        spec = node.find(lal.SubpSpec)
+        decl = node.find(lal.DeclarativePart).find(lal.AdaNodeList)
+        handled = node.find(lal.HandledStmts)
+        statements = handled.find(lal.StmtList) if handled is not None else None
+        if statements is None:
             return
-        is_procedure = self.spec.children[0].is_a(lal.SubpKindProcedure)
+
+        is_procedure = spec.children[0].is_a(lal.SubpKindProcedure)
         if is_procedure:
             # For procedures, we replace the body with a "null;" statement
             # plus
@@ -35,8 +33,8 @@ class HollowBody(ChunkInterface):
         else:
             # For functions, we need to craft a "return" statement to preserve
             # compilability
-            self_name = self.node.find(lal.DefiningName).text
-            params = self.spec.find(lal.ParamSpecList)
+            self_name = node.find(lal.DefiningName).text
+            params = spec.find(lal.ParamSpecList)
             if params:
                 pms = []
                 for j in params.children:
@@ -47,34 +45,25 @@ class HollowBody(ChunkInterface):
                 body_replacement = [f"return {self_name};"]
 
         # Add enough empty lines to preserve line numbers
-        body_replacement += [""] * (
-            self.statements.sloc_range.end.line - self.statements.sloc_range.start.line
-        )
+        statements_sloc = sloc_of(statements)
+        body_replacement += [""] * (statements_sloc[2] - statements_sloc[0])
 
         # Replace the body
-        self.statements_range, self.statements_lines = replace(
-            self.lines, self.statements.sloc_range, body_replacement
-        )
+        self.edits.append((to_sloc_range(statements_sloc), body_replacement))
 
         # Replace the declarative part if it's non-empty
-        if self.decl.sloc_range.end.line != self.decl.sloc_range.start.line:
-            self.decl_range, self.decl_lines = replace(
-                self.lines,
-                self.decl.sloc_range,
-                [""]
-                * (self.decl.sloc_range.end.line - self.decl.sloc_range.start.line + 1),
+        decl_sloc = sloc_of(decl)
+        if decl_sloc[2] != decl_sloc[0]:
+            self.edits.append(
+                (
+                    to_sloc_range(decl_sloc),
+                    [""] * (decl_sloc[2] - decl_sloc[0] + 1),
+                )
             )
 
-    def undo(self):
-        if self.decl_range is not None:
-            _, l = replace(self.lines, self.decl_range, self.decl_lines)
-        if self.statements_range is not None:
-            replace(self.lines, self.statements_range, self.statements_lines)
-
-    def is_in(self, other):
-        return infer_or_equal(
-            other.node.sloc_range.start, self.node.sloc_range.start
-        ) and infer_or_equal(self.node.sloc_range.end, other.node.sloc_range.end)
+    def do(self):
+        for range, new_lines in self.edits:
+            self.buffer.replace(range, new_lines)
 
 
 class HollowOutSubprograms(StrategyInterface):
@@ -82,17 +71,20 @@ class HollowOutSubprograms(StrategyInterface):
        body of subprograms as much as possible
     """
 
-    def run_on_file(self, unit, lines, predicate, save):
+    def chunks(self, unit, file, buffers):
 
         # Create some chunks of work
         chunks = []
 
-        for subp in unit.root.findall(lambda x: x.is_a(lal.SubpBody)):
+        for subp, sloc in index_of(unit).entries(lal.SubpBody):
             # Hollow out the bodies
-            chunks.append(HollowBody(unit, lines, subp))
+            chunks.append(HollowBody(buffers[file], subp, sloc))
 
         # Order the chunks to make sure that nesting edits don't block each other
-        chunks.sort(key=lambda c: c.decl.sloc_range.start.line)
+        chunks.sort(key=lambda c: c.start)
+        return chunks
 
-        t = to_tree(chunks)
-        return dichototree(t, predicate, save)
+    def run_on_file(self, unit, buffer, predicate, save):
+        buffers = BufferSet({buffer.filename: buffer})
+        t = to_tree(self.chunks(unit, buffer.filename, buffers))
+        return dichototree(t, predicate, save, buffers.snapshot)
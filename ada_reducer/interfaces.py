@@ -1,5 +1,12 @@
 class ChunkInterface(object):
-    """One atomic actionable/undoable operation"""
+    """One atomic actionable/undoable operation.
+
+    Chunks are computed once from the tree and do not keep references
+    to libadalang nodes: they record the (line, column) tuples of the
+    start and end of the node they act on, in self.start and self.end.
+    """
+
+    __slots__ = ()
 
     def __init__(self):
         pass
@@ -9,13 +16,25 @@ class ChunkInterface(object):
         pass
 
     def undo(self):
-        """Undo the modification"""
+        """Undo the modification.
+
+        Chunks which only edit buffers of a BufferSet don't implement
+        this: the strategies roll them back with BufferSet.snapshot.
+        """
         pass
 
+    def is_in(self, other):
+        """Return True iff self is located within other"""
+        return other.start <= self.start and self.end <= other.end
+
 
 class StrategyInterface(object):
     """Interface for reducing strategies"""
 
+    edits_other_files = False
+    # Whether the chunks of a file may also edit other files, for
+    # instance the spec of a body
+
     def __init__(self):
         pass
 
@@ -24,3 +43,10 @@ class StrategyInterface(object):
            Return StrategyStats
         """
         pass
+
+    def chunks(self, unit, file, buffers):
+        """Return the list of chunks for this strategy in unit, editing
+           the buffers of the BufferSet buffers, in which file is the key
+           for the buffer of unit.
+        """
+        return []
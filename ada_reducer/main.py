@@ -3,10 +3,31 @@
 import argparse
 from ada_reducer import engine
 from ada_reducer import gui
+from ada_reducer.project_support import default_cache_dir
+from ada_reducer.scheduler import Budget
+from ada_reducer.batch import SlotClient
 import os
 
 
-def _main(single_file, follow_closure, project_file, predicate):
+def _main(
+    single_file,
+    follow_closure,
+    project_file,
+    predicate,
+    cache_dir,
+    timing,
+    workers,
+    worker_timeout,
+    project_wide,
+    budget,
+    jobs,
+    run_dir,
+    priors_file,
+    fast_predicate,
+    max_units,
+    max_rss,
+    slots,
+):
     # sanity check
     if not os.path.exists(project_file):
         print(f"project {project_file} not found")
@@ -16,7 +37,33 @@ def _main(single_file, follow_closure, project_file, predicate):
         print(f"predicate script {predicate} not found")
         return
 
-    r = engine.Reducer(project_file, predicate, single_file, follow_closure)
+    if fast_predicate is not None and not os.path.exists(fast_predicate):
+        print(f"fast predicate script {fast_predicate} not found")
+        return
+
+    if project_wide and single_file:
+        print("--project-wide and --single-file are incompatible")
+        return
+
+    r = engine.Reducer(
+        project_file,
+        predicate,
+        single_file,
+        follow_closure,
+        cache_dir,
+        timing,
+        workers,
+        worker_timeout,
+        project_wide,
+        budget,
+        jobs,
+        run_dir,
+        priors_file,
+        fast_predicate,
+        max_units,
+        max_rss,
+        slots,
+    )
     gui.GUI.run(r)
 
 
@@ -37,6 +84,99 @@ args_parser.add_argument(
     action="store_true",
     help="Allow reducing with'ed units when using --single-file.",
 )
+args_parser.add_argument(
+    "--cache-dir",
+    default=default_cache_dir(),
+    help="Where to cache the resolved project sources across runs.",
+)
+args_parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="Always load the project, do not use or fill the cache.",
+)
+args_parser.add_argument(
+    "--timing",
+    action="store_true",
+    help="Print a breakdown of the time spent starting up.",
+)
+args_parser.add_argument(
+    "--workers",
+    type=lambda s: s.split(","),
+    help="Comma-separated host:port list of predicate workers to run the"
+    " predicate on, see 'python -m ada_reducer.distributed --help'.",
+)
+args_parser.add_argument(
+    "--worker-timeout",
+    type=float,
+    default=120,
+    help="Seconds after which a predicate still running on a worker is"
+    " also sent to another worker.",
+)
+args_parser.add_argument(
+    "--project-wide",
+    action="store_true",
+    help="Run each strategy once on all the files of the project, instead"
+    " of file by file.",
+)
+args_parser.add_argument(
+    "--time-budget",
+    type=float,
+    help="Stop reducing after this many seconds, running first the"
+    " strategies expected to remove the most per predicate run.",
+)
+args_parser.add_argument(
+    "--max-predicate-calls",
+    type=int,
+    help="Stop reducing after this many runs of the predicate.",
+)
+args_parser.add_argument(
+    "--target-size",
+    type=int,
+    help="Stop reducing once the sources of the project take at most"
+    " this many bytes.",
+)
+args_parser.add_argument(
+    "--jobs",
+    type=int,
+    default=os.cpu_count() or 1,
+    help="Number of processes analyzing the specs at startup"
+    " (default: the number of processors).",
+)
+args_parser.add_argument(
+    "--run-dir",
+    help="Where to record the history of the reduction (default: a new"
+    " directory in .adareducer), see 'python -m ada_reducer.snapshots --help'.",
+)
+args_parser.add_argument(
+    "--priors-file",
+    help="Where to keep, across runs, the rate at which each kind of node"
+    " could be removed, used to group the attempts.",
+)
+args_parser.add_argument(
+    "--fast-predicate",
+    help="A script which returns 0 when the predicate may pass, for"
+    " instance a semantic check with 'gcc -c -gnatc', run first: the"
+    " predicate only runs if it passes.",
+)
+args_parser.add_argument(
+    "--max-units",
+    type=int,
+    help="Start over with a fresh analysis context, keeping only the units"
+    " used most recently, when more than this many units are loaded.",
+)
+args_parser.add_argument(
+    "--max-rss",
+    type=int,
+    help="Likewise, when the process uses more than this many megabytes.",
+)
+args_parser.add_argument(
+    "--slot-server",
+    help="In batch mode, the host:port to ask for a slot before running"
+    " the predicate, see 'python -m ada_reducer.batch --help'.",
+)
+args_parser.add_argument(
+    "--job-name", default="adareducer", help="The name of the job in batch mode."
+)
 args_parser.add_argument("project_file")
 args_parser.add_argument("predicate")
 
@@ -48,6 +188,21 @@ def main():
         args.follow_closure,
         args.project_file,
         args.predicate,
+        None if args.no_cache else args.cache_dir,
+        args.timing,
+        args.workers,
+        args.worker_timeout,
+        args.project_wide,
+        Budget(args.time_budget, args.max_predicate_calls, args.target_size),
+        args.jobs,
+        args.run_dir,
+        args.priors_file,
+        args.fast_predicate,
+        args.max_units,
+        None if args.max_rss is None else args.max_rss * 2 ** 20,
+        None
+        if args.slot_server is None
+        else SlotClient(args.slot_server, args.job_name),
     )
 
 
@@ -0,0 +1,66 @@
+import threading
+import libadalang as lal
+
+from ada_reducer.ast_index import ASTIndex
+from ada_reducer.project_support import file_digest
+from ada_reducer.gui import log
+
+
+class Prefetcher(object):
+    """Parses the next file to reduce and indexes it in a background
+    thread, in its own analysis context, while the trivias step, which
+    does not use libadalang, runs the predicate on the current file.
+
+    Libadalang is not thread-safe: the main thread must call wait before
+    using it while a file is being prefetched. Candidates and chunks are
+    not prepared ahead: building them needs libadalang in the main thread.
+    """
+
+    def __init__(self, unit_provider):
+        self.unit_provider = unit_provider
+        self.thread = None
+
+        self.file = None
+        # The file being prefetched
+
+        self.result = None
+        # (context, unit, index, digest of the file which was parsed)
+
+    def start(self, file):
+        """Start parsing file in the background"""
+        self.wait()
+        self.file = file
+        self.result = None
+        self.thread = threading.Thread(target=self.prefetch, args=(file,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def prefetch(self, file):
+        try:
+            digest = file_digest(file)
+            context = lal.AnalysisContext(unit_provider=self.unit_provider)
+            unit = context.get_from_file(file)
+            index = ASTIndex(unit)
+        except Exception as e:
+            log(f"could not prefetch {file}: {e}")
+            return
+        # Only keep the result if the file did not change while parsing it
+        if digest is not None and file_digest(file) == digest:
+            self.result = (context, unit, index, digest)
+
+    def take(self, file):
+        """Return (context, unit, index) for file if it was prefetched and
+        did not change since, None otherwise.
+        """
+        if self.file != file:
+            return None
+        self.wait()
+        result, self.result, self.file = self.result, None, None
+        if result is None or file_digest(file) != result[3]:
+            return None
+        return result[0:3]
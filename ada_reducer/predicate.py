@@ -0,0 +1,93 @@
+import os
+import subprocess
+import traceback
+
+
+# Above this many characters, the list of changed files is only passed
+# through the manifest, to stay clear of the limits on the size of the
+# environment.
+MAX_CHANGED_FILES_VARIABLE = 32000
+
+
+def predicate_command(script):
+    """Return the command line running the predicate script"""
+    if script.endswith(".sh"):
+        return ["bash", script]
+    elif script.endswith(".ps1"):
+        return ["powershell", "-File", script]
+    else:
+        return [script]
+
+
+def predicate_environment(
+    changed_files, manifest, state_id, previous_state_id, previous_verdict
+):
+    """Return the environment variables telling the predicate what changed
+    since its previous run.
+
+    changed_files is the list of files modified, created or deleted since
+    the previous run, which is also written to manifest, one per line.
+    previous_verdict is True, False, or None for the first run.
+    """
+    with open(manifest, "w") as f:
+        f.writelines(p + "\n" for p in changed_files)
+
+    env = {
+        "ADAREDUCER_CHANGED_FILES_MANIFEST": manifest,
+        "ADAREDUCER_STATE_ID": str(state_id),
+        "ADAREDUCER_PREVIOUS_STATE_ID": ""
+        if previous_state_id is None
+        else str(previous_state_id),
+        "ADAREDUCER_PREVIOUS_VERDICT": {True: "pass", False: "fail", None: ""}[
+            previous_verdict
+        ],
+    }
+    changed = os.pathsep.join(changed_files)
+    if len(changed) <= MAX_CHANGED_FILES_VARIABLE:
+        env["ADAREDUCER_CHANGED_FILES"] = changed
+    return env
+
+
+def run_script(script, cwd=None, env=None):
+    """Run the predicate script in cwd, with the additional environment
+    variables in env.
+
+    Return a tuple (True iff the script returned 0, its output).
+    """
+    if env is not None:
+        env = dict(os.environ, **env)
+    out = subprocess.run(
+        predicate_command(script),
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output = "\n".join(o.decode(errors="replace") for o in (out.stdout, out.stderr))
+    return (out.returncode == 0, output)
+
+
+class PredicateRequest(object):
+    """What an in-process predicate is told about the state of the sources
+    to check, see predicate_environment.
+    """
+
+    __slots__ = ("changed_files", "state_id", "previous_state_id", "previous_verdict")
+
+    def __init__(self, changed_files, state_id, previous_state_id, previous_verdict):
+        self.changed_files = changed_files
+        self.state_id = state_id
+        self.previous_state_id = previous_state_id
+        self.previous_verdict = previous_verdict
+
+
+def call_predicate(predicate, request):
+    """Call predicate, a function taking a PredicateRequest, in this process.
+
+    Return a tuple (True iff it returned a true value, its output). If it
+    raises an exception, it fails, and its output is the traceback.
+    """
+    try:
+        return (bool(predicate(request)), "")
+    except Exception:
+        return (False, traceback.format_exc())
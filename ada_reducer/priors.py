@@ -0,0 +1,85 @@
+import json
+import os
+
+
+# Chunks whose probability of being actioned is below this are tried
+# apart from the others, in smaller groups, see dichotomize.
+UNLIKELY = 0.2
+
+
+def chunk_key(chunk):
+    """Return the key under which the outcomes of chunk are counted: its
+    class and the kind of node it acts on, for instance
+    "RemoveStatement:CallStmt". chunk may be a TreeNode holding the chunk.
+    """
+    chunk = getattr(chunk, "element", chunk)
+    return f"{type(chunk).__name__}:{getattr(chunk, 'kind', None)}"
+
+
+class KindPriors(object):
+    """The rate at which the chunks of each kind could be actioned,
+    learned during the run and possibly loaded from previous runs.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        # keys: see chunk_key
+        # values: [number of chunks actioned, number of chunks tried alone
+        #          or actioned]
+
+        self.attempted = None
+        # The chunks the predicate is about to check, see attempt
+
+    def probability(self, chunk):
+        """Return the estimated probability that chunk can be actioned.
+        This is 1/2 for kinds never seen.
+        """
+        actioned, tried = self.counts.get(chunk_key(chunk), (0, 0))
+        return (actioned + 1) / (tried + 2)
+
+    def learn(self, chunks, actioned):
+        """Record the outcome of an attempt to action chunks. When several
+        chunks fail together, we don't know which one is to blame: only
+        successes, and failures of a single chunk, are recorded.
+        """
+        if not actioned and len(chunks) != 1:
+            return
+        for chunk in chunks:
+            counts = self.counts.setdefault(chunk_key(chunk), [0, 0])
+            counts[0] += 1 if actioned else 0
+            counts[1] += 1
+
+    def attempt(self, chunks):
+        """Record that chunks were applied, and that the next verdict of
+        the predicate is about them.
+        """
+        self.attempted = chunks
+
+    def verdict(self, actioned):
+        """Learn from the verdict of the predicate on the chunks attempted
+        last, if any.
+
+        Only actual verdicts of the full predicate are learned from:
+        actioned is None when there is none, for instance when the fast
+        predicate failed.
+        """
+        chunks, self.attempted = self.attempted, None
+        if chunks is not None and actioned is not None:
+            self.learn(chunks, actioned)
+
+    def load(self, filename):
+        """Add the counts saved in filename, if it exists"""
+        if not os.path.exists(filename):
+            return
+        with open(filename) as f:
+            for key, (actioned, tried) in json.load(f).items():
+                counts = self.counts.setdefault(key, [0, 0])
+                counts[0] += actioned
+                counts[1] += tried
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.counts, f, indent=1, sort_keys=True)
+
+
+KIND_PRIORS = KindPriors()
@@ -1,17 +1,169 @@
+import hashlib
+import json
 import os
+import re
+from contextlib import nullcontext
+import threading
 import libadalang as lal
 from pathlib import PurePath
 
 
+# Bump this when the layout of the cache entries changes
+CACHE_VERSION = 4
+
+# Environment variables which influence the loading of any project
+PROJECT_ENVIRONMENT = ["GPR_PROJECT_PATH", "GPR_PROJECT_PATH_FILE", "ADA_PROJECT_PATH"]
+
+# Matches the string literals in a project file, and the names of the
+# external variables it references.
+GPR_STRING = re.compile(r'"([^"]*)"')
+GPR_EXTERNAL = re.compile(r'external(?:_as_list)?\s*\(\s*"([^"]+)"', re.IGNORECASE)
+GPR_WITH = re.compile(r"^\s*(?:limited\s+)?with\s+([^;]*);", re.IGNORECASE | re.MULTILINE)
+GPR_SOURCE_DIRS = re.compile(r"for\s+Source_Dirs\s+use\s*\(([^)]*)\)", re.IGNORECASE)
+
+
+def default_cache_dir():
+    """Return the directory where adareducer caches data across runs"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "adareducer")
+
+
+def file_digest(path):
+    """Return the sha1 of the contents of path, None if it can't be read"""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def source_names(path, extensions):
+    """Return the sorted names of the files in directory path which have
+    one of extensions, None if the directory is gone.
+
+    Unlike the timestamp of the directory, this is not changed by the
+    temporary files, renames and rewrites of adareducer itself.
+    """
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return None
+    return sorted(n for n in names if os.path.splitext(n)[1].lower() in extensions)
+
+
+def subdirectories(path):
+    """Return the sorted list of the directories under path, recursively"""
+    result = []
+    for root, dirs, _ in os.walk(path):
+        result.extend(os.path.join(root, d) for d in dirs)
+    return sorted(result)
+
+
+def declared_source_dirs(gpr):
+    """Return (directories, trees) for the source directories declared in
+    the project file gpr: trees are the directories declared with "**",
+    whose subdirectories are source directories too.
+
+    This is a textual approximation, like project_closure.
+    """
+    with open(gpr, encoding="latin-1") as f:
+        text = f.read()
+    directories = set()
+    trees = set()
+    for declaration in GPR_SOURCE_DIRS.findall(text):
+        for name in GPR_STRING.findall(declaration):
+            recursive = name.endswith("**")
+            if recursive:
+                name = name[:-2]
+            path = os.path.normpath(os.path.join(os.path.dirname(gpr), name))
+            directories.add(path)
+            if recursive:
+                trees.add(path)
+                directories.update(subdirectories(path))
+    return (directories, trees)
+
+
+def project_closure(project_file):
+    """Return the set of project files that project_file depends on,
+    including itself.
+
+    This is a textual approximation: it follows the "with" clauses and
+    the string literals naming .gpr files (aggregated projects, extended
+    projects), and ignores the projects which cannot be found next to
+    the importing project or on the project path.
+    """
+    search_path = [
+        d for d in os.environ.get("GPR_PROJECT_PATH", "").split(os.pathsep) if d
+    ]
+    result = set()
+    to_visit = [os.path.abspath(project_file)]
+    while to_visit:
+        gpr = to_visit.pop()
+        if gpr in result or not os.path.isfile(gpr):
+            continue
+        result.add(gpr)
+        with open(gpr, encoding="latin-1") as f:
+            text = f.read()
+
+        names = [n for n in GPR_STRING.findall(text) if n.lower().endswith(".gpr")]
+        for clause in GPR_WITH.findall(text):
+            names.extend(GPR_STRING.findall(clause))
+
+        for name in names:
+            if not name.lower().endswith(".gpr"):
+                name += ".gpr"
+            for d in [os.path.dirname(gpr)] + search_path:
+                candidate = os.path.abspath(os.path.join(d, name))
+                if os.path.isfile(candidate):
+                    to_visit.append(candidate)
+                    break
+    return result
+
+
 class ProjectResolver(object):
     """Utility to resolve base names"""
 
-    def __init__(self, project_file):
+    def __init__(self, project_file, cache_dir=None, stats=None):
+        self.project_file = os.path.abspath(project_file)
+        self.cache_dir = cache_dir
+        # Where to cache the resolved sources, None not to cache them
+
+        self.stats = stats
         self.files = {}
         # The sources in this project tree, not including externally built
         # projects.
         # Keys: base names, values: full names
 
+        self.dependency_files = []
+        # The full names of all the sources that the project depends on,
+        # including those of externally built projects
+
+        self.gpr = None
+        # The loaded project, None when the sources come from the cache
+
+        self._unit_provider = None
+        self._unit_provider_thread = None
+
+        if self.load_from_cache():
+            return
+
+        with self.timed("load project"):
+            self.load_project()
+
+        with self.timed("write project cache"):
+            self.save_to_cache()
+
+    def timed(self, label):
+        """Return a context manager timing its body in self.stats"""
+        if self.stats is None:
+            return nullcontext()
+        return self.stats.time(label)
+
+    def load_project(self):
+        """Fill self.files by loading the project"""
+
         # Use the Libadalang API to query the sources for this project.
         # This collects the sources in all the project tree, not including
         # sources in externally built projects.
@@ -19,8 +171,8 @@ class ProjectResolver(object):
         # TODO: It may be necessary to pass scenario variables, target and
         # runtime name information here in order for the project file to load
         # correctly.
-        gpr = lal.GPRProject(project_file)
-        files = gpr.source_files()
+        self.gpr = lal.GPRProject(self.project_file)
+        files = self.gpr.source_files()
 
         for full_path in files:
             basename = PurePath(full_path).name
@@ -35,6 +187,136 @@ class ProjectResolver(object):
 
                 self.files[basename] = str(full_path)
 
+        self.dependency_files = [
+            str(f) for f in self.gpr.source_files(mode=lal.SourceFilesMode.whole_project)
+        ]
+
+    # Cache support
+
+    def cache_file(self):
+        """Return the cache file for this project"""
+        key = hashlib.sha1(self.project_file.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"project-{key}.json")
+
+    def cache_key(self):
+        """Return the data which must be unchanged for the cache to be valid:
+        the contents of the project files, the names of the files in the
+        directories containing sources or declared as source directories,
+        the subdirectories of those declared with "**", and the environment
+        variables used by the projects.
+        """
+        gprs = project_closure(self.project_file)
+        dirs = {os.path.dirname(f) for f in self.files.values()}
+        dirs.update(os.path.dirname(g) for g in gprs)
+        trees = set()
+        for gpr in gprs:
+            # Including those which held no sources yet
+            declared, declared_trees = declared_source_dirs(gpr)
+            dirs.update(declared)
+            trees.update(declared_trees)
+        extensions = {".gpr", ".ads", ".adb"}
+        extensions.update(os.path.splitext(f)[1].lower() for f in self.files.values())
+
+        variables = set(PROJECT_ENVIRONMENT)
+        for gpr in gprs:
+            with open(gpr, encoding="latin-1") as f:
+                variables.update(GPR_EXTERNAL.findall(f.read()))
+
+        return {
+            "gpr_files": {g: file_digest(g) for g in sorted(gprs)},
+            "extensions": sorted(extensions),
+            "source_dirs": {d: source_names(d, extensions) for d in sorted(dirs)},
+            "source_trees": {t: subdirectories(t) for t in sorted(trees)},
+            "environment": {v: os.environ.get(v) for v in sorted(variables)},
+        }
+
+    def load_from_cache(self):
+        """Fill self.files from the cache, return False if the cache
+        is missing or stale.
+        """
+        if self.cache_dir is None:
+            return False
+
+        with self.timed("read project cache"):
+            try:
+                with open(self.cache_file()) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return False
+
+            if entry.get("version") != CACHE_VERSION:
+                return False
+
+            key = entry["key"]
+            for gpr, digest in key["gpr_files"].items():
+                if file_digest(gpr) != digest:
+                    return False
+            extensions = set(key["extensions"])
+            for d, names in key["source_dirs"].items():
+                if source_names(d, extensions) != names:
+                    return False
+            for tree, subdirs in key["source_trees"].items():
+                if subdirectories(tree) != subdirs:
+                    return False
+            for variable, value in key["environment"].items():
+                if os.environ.get(variable) != value:
+                    return False
+
+            self.files = entry["files"]
+            self.dependency_files = entry["dependency_files"]
+            return True
+
+    def save_to_cache(self):
+        """Save self.files to the cache, if any"""
+        if self.cache_dir is None:
+            return
+
+        entry = {
+            "version": CACHE_VERSION,
+            "key": self.cache_key(),
+            "files": self.files,
+            "dependency_files": self.dependency_files,
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f"{self.cache_file()}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self.cache_file())
+        except OSError:
+            # Caching is an optimization, never fail because of it
+            pass
+
+    # Unit provider
+
+    def start_loading_unit_provider(self):
+        """Start creating the unit provider in the background, so that
+        this overlaps with other work, for instance running the predicate.
+        """
+        if self._unit_provider is None and self._unit_provider_thread is None:
+            self._unit_provider_thread = threading.Thread(
+                target=self.load_unit_provider, daemon=True
+            )
+            self._unit_provider_thread.start()
+
+    def load_unit_provider(self):
+        """Create the unit provider for the project"""
+        if self.gpr is not None:
+            # The project is already loaded: don't load it a second time
+            self._unit_provider = self.gpr.create_unit_provider()
+        else:
+            self._unit_provider = lal.UnitProvider.for_project(self.project_file)
+
+    def unit_provider(self):
+        """Return the unit provider for the project, creating it if needed"""
+        with self.timed("create unit provider"):
+            if self._unit_provider_thread is not None:
+                self._unit_provider_thread.join()
+                self._unit_provider_thread = None
+            if self._unit_provider is None:
+                self.load_unit_provider()
+        return self._unit_provider
+
     def find(self, basename):
         """Return full path to file named basename in project, None if not found"""
         if not basename in self.files:
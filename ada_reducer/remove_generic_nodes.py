@@ -1,74 +1,55 @@
 import os
 import libadalang as lal
-from ada_reducer.types import Buffer, infer_or_equal
+from ada_reducer.types import BufferSet, sloc_of, to_sloc_range
 from ada_reducer.interfaces import ChunkInterface, StrategyInterface
 from ada_reducer.dichotomy import to_tree, dichototree
+from ada_reducer.ast_index import index_of
 
 
 DEBUG = False
 
 
-class AbstractRemoveNode(object):
-    def __init__(self, node, buffers):
-        self.node = node
+class AbstractRemoveNode(ChunkInterface):
+    __slots__ = ("buffers", "start", "end", "kind", "locations_to_remove")
+
+    def __init__(self, node, sloc, buffers):
         self.buffers = buffers
+        self.start = sloc[0:2]
+        self.end = sloc[2:4]
+        self.kind = type(node).__name__
+
         self.locations_to_remove = []
         # a list which contains
         #  - (file, range, replacement_lines)
 
-        self.locations_removed = []
-        # a list which contains
-        #  - (file, range, replacement_lines)
+        self.find_locations_to_remove(node)
 
-    def find_locations_to_remove(self):
+    def find_locations_to_remove(self, node):
         """Fill self.locations_to_remove with the locations to remove, based
-           on self.node"""
+           on node"""
         pass
 
     def add_location_to_replace_with_empty(self, node):
         if node is None:
             return
         file = node.unit.filename
-        if file not in self.buffers:
-            self.buffers[file] = Buffer(file)
-        num_lines = node.sloc_range.end.line - node.sloc_range.start.line + 1
-        self.locations_to_remove.append((file, node.sloc_range, [""] * num_lines))
-
-    def apply(self, locations_list, to_list):
-        """Apply the changes in the given list.
-           Store the reverse changes in to_list."""
+        sloc = sloc_of(node)
+        num_lines = sloc[2] - sloc[0] + 1
+        self.locations_to_remove.append((file, to_sloc_range(sloc), [""] * num_lines))
 
-        for file, range, replacement_lines in locations_list:
+    def do(self):
+        for file, range, replacement_lines in self.locations_to_remove:
             if DEBUG:
                 print(f"{file}: replacing {range}")
-            r, l = self.buffers[file].replace(range, replacement_lines)
-
-            to_list.append((file, r, l))
-
-    def do(self):
-        self.locations_to_remove = []
-        self.find_locations_to_remove()
-        self.apply(self.locations_to_remove, self.locations_removed)
-        self.locations_to_remove = []
-
-    def undo(self):
-        bin = []
-        self.apply(self.locations_removed, bin)
-        self.locations_removed = []
-
-    def is_in(self, other):
-        return infer_or_equal(
-            other.node.sloc_range.start, self.node.sloc_range.start
-        ) and infer_or_equal(self.node.sloc_range.end, other.node.sloc_range.end)
+            self.buffers[file].replace(range, replacement_lines)
 
 
 class RemovePackage(AbstractRemoveNode):
-    def __init__(self, node, buffers):
-        super().__init__(node, buffers)
+    __slots__ = ()
 
-    def find_locations_to_remove(self):
-        self.add_location_to_replace_with_empty(self.node)
-        decl = self.node.p_decl_part()
+    def find_locations_to_remove(self, node):
+        self.add_location_to_replace_with_empty(node)
+        decl = node.p_decl_part()
         if decl is None:
             return
         if decl.is_a(lal.GenericPackageInternal):
@@ -79,64 +60,67 @@ class RemovePackage(AbstractRemoveNode):
 class RemovePackages(StrategyInterface):
     """ Remove package bodies """
 
+    edits_other_files = True
+
     def save(self):
-        for file in self.buffers:
-            self.buffers[file].save()
+        self.buffers.save()
 
-    def run_on_file(self, context, file, predicate):
+    def run_on_file(self, context, file, predicate, buffers=None):
         self.context = context
         self.predicate = predicate
 
-        self.buffers = {file: Buffer(file)}
+        self.buffers = buffers if buffers is not None else BufferSet()
         unit = self.context.get_from_file(file)
 
         if unit.root is None:
             return
 
-        # List all subprograms in the file
+        t = to_tree(self.chunks(unit, file, self.buffers))
+        r = dichototree(t, predicate, self.save, self.buffers.snapshot)
+        return r
 
-        chunks = []
-        for pbody in unit.root.findall(lambda x: x.is_a(lal.PackageBody)):
-            # Create a chunk for each subprogram
-            chunks.append(RemovePackage(pbody, self.buffers))
+    def chunks(self, unit, file, buffers):
+        # List all package bodies in the file
 
-        t = to_tree(chunks)
-        r = dichototree(t, predicate, self.save)
-        return r
+        chunks = []
+        for pbody, sloc in index_of(unit).entries(lal.PackageBody):
+            # Create a chunk for each package body
+            chunks.append(RemovePackage(pbody, sloc, buffers))
+        return chunks
 
 
 class RemoveAspect(AbstractRemoveNode):
-    def __init__(self, node, buffers):
-        super().__init__(node, buffers)
+    __slots__ = ()
 
-    def find_locations_to_remove(self):
-        self.add_location_to_replace_with_empty(self.node)
+    def find_locations_to_remove(self, node):
+        self.add_location_to_replace_with_empty(node)
 
 
 class RemoveAspects(StrategyInterface):
     """ Remove aspects"""
 
     def save(self):
-        for file in self.buffers:
-            self.buffers[file].save()
+        self.buffers.save()
 
-    def run_on_file(self, context, file, predicate):
+    def run_on_file(self, context, file, predicate, buffers=None):
         self.context = context
         self.predicate = predicate
 
-        self.buffers = {file: Buffer(file)}
+        self.buffers = buffers if buffers is not None else BufferSet()
         unit = self.context.get_from_file(file)
 
         if unit.root is None:
             return
 
+        t = to_tree(self.chunks(unit, file, self.buffers))
+        r = dichototree(t, predicate, self.save, self.buffers.snapshot)
+        return r
+
+    def chunks(self, unit, file, buffers):
         # List all aspects in the file
 
         chunks = []
-        for pbody in unit.root.findall(lambda x: x.is_a(lal.AspectSpec)):
+        for pbody, sloc in index_of(unit).entries(lal.AspectSpec):
             # Create a chunk for each aspect
-            chunks.append(RemoveAspect(pbody, self.buffers))
-
-        t = to_tree(chunks)
-        r = dichototree(t, predicate, self.save)
-        return r
\ No newline at end of file
+            chunks.append(RemoveAspect(pbody, sloc, buffers))
+        return chunks
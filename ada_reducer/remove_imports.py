@@ -1,46 +1,159 @@
+import bisect
 import libadalang as lal
-from ada_reducer.types import Buffer
+from ada_reducer.types import BufferSet, to_sloc_range
 from ada_reducer.interfaces import ChunkInterface, StrategyInterface
 from ada_reducer.dichotomy import dichotomize
+from ada_reducer.ast_index import index_of
+from ada_reducer.gui import log
 
 
 class RemoveClause(ChunkInterface):
-    def __init__(self, buffer, node):
+    __slots__ = ("buffer", "start", "end", "kind")
+
+    def __init__(self, buffer, node, sloc):
         self.buffer = buffer
-        self.node = node
+        self.start = sloc[0:2]
+        self.end = sloc[2:4]
+        self.kind = type(node).__name__
 
     def do(self):
-        num_lines = self.node.sloc_range.end.line - self.node.sloc_range.start.line + 1
-        new_text = [""] * num_lines
-        self.range, self.lines = self.buffer.replace(self.node.sloc_range, new_text)
+        new_text = [""] * (self.end[0] - self.start[0] + 1)
+        self.buffer.replace(to_sloc_range(self.start + self.end), new_text)
+
+
+# The declarations of packages, which can appear in the prefix of a name
+# only to designate the entity in the suffix
+PACKAGE_DECLS = (
+    lal.BasePackageDecl,
+    lal.PackageRenamingDecl,
+    lal.GenericPackageInstantiation,
+)
+
+
+def referenced_decl(name):
+    """Return the declaration of the entity name refers to, None if
+    name cannot be resolved.
+    """
+    try:
+        return name.p_referenced_decl()
+    except lal.PropertyError:
+        return None
+
+
+def is_prefix(name):
+    """Return True iff name is in the prefix of a dotted name, like Ada
+    and Containers in Ada.Containers.Vectors.
+    """
+    node = name
+    parent = node.parent
+    if isinstance(parent, lal.DottedName) and parent.f_suffix == node:
+        node = parent
+        parent = node.parent
+    return isinstance(parent, lal.DottedName) and parent.f_prefix == node
+
+
+def unused_clauses(unit, clauses):
+    """Return the subset of clauses, a list of (node, sloc tuple) for
+    with and use clauses of unit, which no name in unit refers to.
 
-    def undo(self):
-        self.buffer.replace(self.range, self.lines)
+    A clause is considered used as soon as a name outside of the with
+    and use clauses refers to an entity declared in the file of one of
+    the packages it names, including their parents, which a clause on
+    a child makes visible. Packages in the prefix of a name, like Ada in
+    Ada.Text_IO.Put_Line, don't count: the clause on the package of the
+    entity is enough. This is only an approximation, to be confirmed by
+    running the predicate.
+    """
+    clauses = sorted(clauses, key=lambda c: c[1])
+    starts = [sloc[0:2] for _, sloc in clauses]
+
+    clause_files = [set() for _ in clauses]
+    # For each clause, the files declaring the packages it names
+
+    resolved = [True] * len(clauses)
+    # Whether all the names in each clause could be resolved
+
+    referenced = set()
+    # The files which the names outside of the clauses refer to
+
+    for name, sloc in index_of(unit).entries(lal.BaseId):
+        # Find the clause this name is in, if any
+        i = bisect.bisect_right(starts, sloc[0:2]) - 1
+        in_clause = i >= 0 and sloc[2:4] <= clauses[i][1][2:4]
+
+        decl = referenced_decl(name)
+        filename = None if decl is None else decl.unit.filename
+        if in_clause:
+            if filename is None:
+                resolved[i] = False
+            else:
+                clause_files[i].add(filename)
+        elif filename is not None:
+            if not (isinstance(decl, PACKAGE_DECLS) and is_prefix(name)):
+                referenced.add(filename)
+
+    return [
+        clause
+        for clause, files, ok in zip(clauses, clause_files, resolved)
+        if ok and files and not (files & referenced)
+    ]
 
 
 class RemoveImports(StrategyInterface):
-    """ Remove subprograms """
+    """ Remove with and use clauses """
 
     def save(self):
-        for file in self.buffers:
-            self.buffers[file].save()
+        self.buffers.save()
+
+    def chunks(self, unit, file, buffers):
+        return [
+            RemoveClause(buffers[file], node, sloc)
+            for node, sloc in index_of(unit).entries(
+                lal.UsePackageClause, lal.WithClause
+            )
+        ]
 
-    def run_on_file(self, context, file, predicate):
-        self.buffers = {file: Buffer(file)}
+    def run_on_file(self, context, file, predicate, buffers=None):
+        self.buffers = buffers if buffers is not None else BufferSet()
         unit = context.get_from_file(file)
 
         if unit.root is None:
             return
 
-        chunks = []
+        index = index_of(unit)
+        kinds = (lal.UsePackageClause, lal.WithClause)
 
-        # First remove all the use clauses that we can, then
-        # try with clauses
+        # First remove in one go the clauses which look unused
 
-        for type in (lal.UsePackageClause, lal.WithClause):
+        unused = unused_clauses(unit, index.entries(*kinds))
+        removed = set()
+        if unused:
+            chunks = [RemoveClause(self.buffers[file], n, s) for n, s in unused]
+            chunks.sort(key=lambda c: c.start)
+            before = self.buffers.snapshot()
+            for chunk in reversed(chunks):
+                chunk.do()
+            self.save()
+            passed = False
+            try:
+                passed = predicate()
+            finally:
+                # See dichotomize
+                if not passed:
+                    before.restore()
+                    self.save()
+            if passed:
+                log(f"   removed {len(chunks)} unused clauses")
+                removed = {s for _, s in unused}
 
-            for node in unit.root.findall(lambda x: x.is_a(type)):
-                # Create a chunk for each clause
-                chunks.append(RemoveClause(self.buffers[file], node))
+        # Then remove all the use clauses that we can, then
+        # try with clauses
 
-            dichotomize(chunks, predicate, self.save)
+        for type in kinds:
+            chunks = [
+                RemoveClause(self.buffers[file], node, sloc)
+                for node, sloc in index.entries(type)
+                if sloc not in removed
+            ]
+            if chunks:
+                dichotomize(chunks, predicate, self.save, self.buffers.snapshot)
@@ -1,80 +1,118 @@
+import functools
 import libadalang as lal
-from ada_reducer.types import replace, infer_or_equal
+from ada_reducer.types import BufferSet, sloc_of, to_sloc_range
 from ada_reducer.interfaces import ChunkInterface, StrategyInterface
-from ada_reducer.dichotomy import to_tree, dichototree
+from ada_reducer.dichotomy import LazyTreeNode, TreeNode, dichototree
+from ada_reducer.ast_index import index_of
 
 
 class RemoveStatement(ChunkInterface):
-    def __init__(self, node, lines, is_lone):
-        self.node = node
-        self.is_lone = is_lone
-        self.lines = lines
-
-    def do(self):
-        num_lines = self.node.sloc_range.end.line - self.node.sloc_range.start.line + 1
-        new_text = ["null;"] + [""] * (num_lines - 1)
-        self.range, self.new_lines = replace(self.lines, self.node.sloc_range, new_text)
-
-    def undo(self):
-        replace(self.lines, self.range, self.new_lines)
-
-    def __str__(self):
-        return f"remove {self.node.sloc_range}"
-
-    def is_in(self, other):
-        return infer_or_equal(
-            other.node.sloc_range.start, self.node.sloc_range.start
-        ) and infer_or_equal(self.node.sloc_range.end, other.node.sloc_range.end)
-
+    __slots__ = ("buffer", "start", "end", "kind", "is_lone", "new_text")
 
-class RemoveDecl(ChunkInterface):
-    def __init__(self, node, lines, is_lone):
-        self.node = node
+    def __init__(self, node, sloc, buffer, is_lone):
+        self.start = sloc[0:2]
+        self.end = sloc[2:4]
+        self.kind = type(node).__name__
         self.is_lone = is_lone
-        self.lines = lines
+        self.buffer = buffer
+        self.new_text = ["null;"] + [""] * (sloc[2] - sloc[0])
 
     def do(self):
-        num_lines = self.node.sloc_range.end.line - self.node.sloc_range.start.line + 1
-        new_text = [""] * (num_lines)
-        self.range, self.new_lines = replace(self.lines, self.node.sloc_range, new_text)
-
-    def undo(self):
-        replace(self.lines, self.range, self.new_lines)
+        self.buffer.replace(to_sloc_range(self.start + self.end), self.new_text)
 
     def __str__(self):
-        return f"remove {self.node.sloc_range}"
-
-    def is_in(self, other):
-        return infer_or_equal(
-            other.node.sloc_range.start, self.node.sloc_range.start
-        ) and infer_or_equal(self.node.sloc_range.end, other.node.sloc_range.end)
+        return f"remove {to_sloc_range(self.start + self.end)}"
+
+
+class RemoveDecl(RemoveStatement):
+    __slots__ = ()
+
+    def __init__(self, node, sloc, buffer, is_lone):
+        super().__init__(node, sloc, buffer, is_lone)
+        self.new_text = [""] * (sloc[2] - sloc[0] + 1)
+
+
+def chunk_kinds(node):
+    """Return the chunk classes to apply to the items of node, in the
+    order in which they are attempted, if node is a list of statements
+    or declarations.
+    """
+    kinds = []
+    if node.is_a(lal.StmtList):
+        kinds.append(RemoveStatement)
+    if node.is_a(lal.DeclList, lal.AdaNodeList):
+        kinds.append(RemoveDecl)
+    return kinds
+
+
+def item_node(item, kinds, buffer, is_lone):
+    """Return the tree node for the chunks of kinds on item: the next kind
+    is only attempted if the previous one fails, and the statements and
+    declarations within item are only looked for if they all fail.
+    """
+    sloc = sloc_of(item)
+    nodes = [LazyTreeNode(kind(item, sloc, buffer, is_lone)) for kind in kinds]
+    for parent, child in zip(nodes, nodes[1:]):
+        parent.expanded = [child]
+    nodes[-1].expand = functools.partial(child_nodes, item, buffer)
+    return nodes[0]
+
+
+def child_nodes(node, buffer):
+    """Return the tree nodes for the outermost statements and declarations
+    within node, ordered like to_tree does.
+    """
+    result = []
+    to_visit = [c for c in reversed(node.children) if c is not None]
+    while to_visit:
+        n = to_visit.pop()
+        kinds = chunk_kinds(n)
+        if kinds:
+            # Stop there: what is within the items is the next level
+            children = [c for c in n.children if c is not None]
+            is_lone = len(n.children) <= 1
+            for item in children:
+                result.append(item_node(item, kinds, buffer, is_lone))
+        else:
+            to_visit.extend(c for c in reversed(n.children) if c is not None)
+
+    result.sort(key=lambda t: (t.element.start, -t.element.end[0], -t.element.end[1]))
+    return result
 
 
 class RemoveStatements(StrategyInterface):
     """This strategy removes statements from bodies of subprograms"""
 
-    def run_on_file(self, unit, lines, predicate, save):
-        """subps_to_try contains the list of subp nodes to try"""
-
+    def chunks(self, unit, file, buffers):
+        buffer = buffers[file]
         chunks = []
         # Find all statement lists and decl lists
-        if unit.root is None:
-            return
-        for stmtlist in unit.root.findall(lambda x: x.is_a(lal.StmtList)):
+        index = index_of(unit)
+        for stmtlist in index.nodes(lal.StmtList):
             children = stmtlist.children
+            is_lone = len(children) <= 1
             for stmt in children:
-                chunks.append(RemoveStatement(stmt, lines, is_lone=len(children) <= 1))
-        for stmtlist in unit.root.findall(
-            lambda x: x.is_a(lal.DeclList) or x.is_a(lal.AdaNodeList)
-        ):
+                chunks.append(RemoveStatement(stmt, sloc_of(stmt), buffer, is_lone))
+        for stmtlist in index.nodes(lal.DeclList, lal.AdaNodeList):
             children = stmtlist.children
+            is_lone = len(children) <= 1
             for stmt in children:
-                chunks.append(RemoveDecl(stmt, lines, is_lone=len(children) <= 1))
+                chunks.append(RemoveDecl(stmt, sloc_of(stmt), buffer, is_lone))
 
         # Order the chunks
-        chunks.sort(key=lambda c: c.node.sloc_range.start.line)
+        chunks.sort(key=lambda c: c.start[0])
+        return chunks
+
+    def run_on_file(self, unit, buffer, predicate, save):
+        if unit.root is None:
+            return
 
-        t = to_tree(chunks)
+        # Only create the chunks of a level when dichototree gets there,
+        # that is for the statements and declarations within the ones
+        # which could not be removed.
+        buffers = BufferSet({buffer.filename: buffer})
+        t = TreeNode(None)
+        t.children = child_nodes(unit.root, buffer)
 
         # Do the work
-        return dichototree(t, predicate, save)
+        return dichototree(t, predicate, save, buffers.snapshot)
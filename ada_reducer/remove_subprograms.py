@@ -1,73 +1,63 @@
 import os
 import libadalang as lal
-from ada_reducer.types import Buffer, infer_or_equal
+from ada_reducer.types import BufferSet, sloc_of, to_sloc_range
 from ada_reducer.interfaces import ChunkInterface, StrategyInterface
 from ada_reducer.dichotomy import to_tree, dichototree
+from ada_reducer.ast_index import index_of
 
 
 class RemoveSubprogram(ChunkInterface):
-    def __init__(self, file, node, buffers):
-        self.file = file
-        self.node = node
+    __slots__ = ("buffers", "start", "end", "kind", "edits")
+
+    def __init__(self, file, node, sloc, buffers):
         self.buffers = buffers
+        self.start = sloc[0:2]
+        self.end = sloc[2:4]
+        self.kind = type(node).__name__
 
-        # Resolve node
-        self.decl = node.p_decl_part()
-        self.other_file = None
+        self.edits = [(file, to_sloc_range(sloc), [""] * (sloc[2] - sloc[0] + 1))]
+        # The list of (file, range, replacement lines) to apply, in order
 
-    def do(self):
-        num_lines = self.node.sloc_range.end.line - self.node.sloc_range.start.line + 1
-        new_text = [""] * num_lines
-        self.body_range, self.body_lines = self.buffers[self.file].replace(
-            self.node.sloc_range, new_text
-        )
-        if self.decl is None or not os.path.exists(self.decl.unit.filename):
+        # Resolve node
+        decl = node.p_decl_part()
+        if decl is None or not os.path.exists(decl.unit.filename):
             return
-        self.other_file = self.decl.unit.filename
-        if self.other_file not in self.buffers:
-            self.buffers[self.other_file] = Buffer(self.other_file)
-
-        num_lines = self.decl.sloc_range.end.line - self.decl.sloc_range.start.line + 1
-        new_text = [""] * num_lines
-        self.spec_range, self.spec_lines = self.buffers[self.other_file].replace(
-            self.decl.sloc_range, new_text
-        )
+        other_file = decl.unit.filename
 
-    def undo(self):
-        self.buffers[self.file].replace(self.body_range, self.body_lines)
-        if self.other_file is not None:
-            self.buffers[self.other_file].replace(self.spec_range, self.spec_lines)
+        decl_sloc = sloc_of(decl)
+        num_lines = decl_sloc[2] - decl_sloc[0] + 1
+        self.edits.append((other_file, to_sloc_range(decl_sloc), [""] * num_lines))
 
-    def is_in(self, other):
-        return infer_or_equal(
-            other.node.sloc_range.start, self.node.sloc_range.start
-        ) and infer_or_equal(self.node.sloc_range.end, other.node.sloc_range.end)
+    def do(self):
+        for file, range, new_lines in self.edits:
+            self.buffers[file].replace(range, new_lines)
 
 
 class RemoveSubprograms(StrategyInterface):
     """ Remove subprograms """
 
+    edits_other_files = True
+
     def save(self):
-        for file in self.buffers:
-            self.buffers[file].save()
+        self.buffers.save()
+
+    def chunks(self, unit, file, buffers):
+        # List all subprograms in the file
 
-    def run_on_file(self, context, file, predicate):
+        chunks = []
+        for subp, sloc in index_of(unit).entries(lal.SubpBody, lal.ExprFunction):
+            # Create a chunk for each subprogram
+            chunks.append(RemoveSubprogram(file, subp, sloc, buffers))
+        return chunks
+
+    def run_on_file(self, context, file, predicate, buffers=None):
         self.context = context
 
-        self.buffers = {file: Buffer(file)}
+        self.buffers = buffers if buffers is not None else BufferSet()
         unit = self.context.get_from_file(file)
 
         if unit.root is None:
             return
 
-        # List all subprograms in the file
-
-        chunks = []
-        for subp in unit.root.findall(
-            lambda x: x.is_a(lal.SubpBody) or x.is_a(lal.ExprFunction)
-        ):
-            # Create a chunk for each subprogram
-            chunks.append(RemoveSubprogram(file, subp, self.buffers))
-
-        t = to_tree(chunks)
-        return dichototree(t, predicate, self.save)
+        t = to_tree(self.chunks(unit, file, self.buffers))
+        return dichototree(t, predicate, self.save, self.buffers.snapshot)
@@ -1,35 +1,66 @@
-from ada_reducer.types import Buffer
-from ada_reducer.interfaces import StrategyInterface
+from ada_reducer.types import BufferSet
+from ada_reducer.interfaces import ChunkInterface, StrategyInterface
+
+
+def strip_trivias(lines):
+    """Return lines without blank lines, standalone comments and
+    successive "null;" statements.
+    """
+    last_was_null = False
+
+    # strip manually
+    new = [None]
+    for line in lines[1:]:
+        stripped = line.strip()
+        if stripped == "" or stripped.startswith("--"):
+            pass
+
+        elif stripped == "null;":
+            # Strip successive "null;" statements
+            if not last_was_null:
+                new.append(line)
+            last_was_null = True
+        else:
+            last_was_null = False
+            new.append(line)
+    return new
+
+
+class StripTrivias(ChunkInterface):
+    """Remove the trivias of a whole buffer"""
+
+    __slots__ = ("buffer", "start", "end", "kind")
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.start = (1, 1)
+        self.end = (len(buffer.lines), 1)
+        self.kind = "trivias"
+
+    def do(self):
+        self.buffer.lines = strip_trivias(self.buffer.lines)
 
 
 class RemoveTrivias(StrategyInterface):
     """ Remove blank lines and standalone comments """
 
-    def run_on_file(self, file, predicate):
-        buf = Buffer(file)
-        orig = list(buf.lines)
-        last_was_null = False
-
-        # strip manually
-        new = [None]
-        for line in buf.lines[1:]:
-            stripped = line.strip()
-            if stripped == "" or stripped.startswith("--"):
-                pass
-
-            elif stripped == "null;":
-                # Strip successive "null;" statements
-                if not last_was_null:
-                    new.append(line)
-                last_was_null = True
-            else:
-                last_was_null = False
-                new.append(line)
+    def chunks(self, unit, file, buffers):
+        return [StripTrivias(buffers[file])]
+
+    def run_on_file(self, file, predicate, buffers=None):
+        if buffers is None:
+            buffers = BufferSet()
+        buf = buffers[file]
+        orig = buf.lines
 
-        buf.lines = new
-        buf.save()
+        buf.lines = strip_trivias(orig)
+        buffers.save()
 
-        if not predicate():
-            # if the predicate failed, put back the orig lines
-            buf.lines = orig
-            buf.save()
+        passed = False
+        try:
+            passed = predicate()
+        finally:
+            if not passed:
+                # if the predicate failed, put back the orig lines
+                buf.lines = orig
+                buffers.save()
@@ -0,0 +1,143 @@
+import os
+import time
+
+
+# For each step which can be run on a file, the fraction of the file it
+# is expected to remove before any run has been observed
+PRIORS = {
+    "hollow": 0.4,
+    "truncate": 0.2,
+    "statements": 0.2,
+    "aspects": 0.02,
+    "subprograms": 0.2,
+    "packages": 0.1,
+    "imports": 0.02,
+    "trivias": 0.1,
+    "delete": 0.05,
+}
+
+# Weight of the priors above, in bytes of observed files
+PRIOR_WEIGHT = 10000
+
+# Expected number of predicate runs for a step, before any is observed
+PRIOR_CALLS = 4
+
+
+class BudgetExhausted(Exception):
+    """Raised instead of running the predicate once the budget is
+    exhausted. Whoever modified the sources before running the predicate
+    must undo the modification, as if it had failed, and let it through.
+    """
+
+    pass
+
+
+class Budget(object):
+    """Limits on the time and the number of predicate runs of a reduction,
+    and size below which to stop reducing.
+    """
+
+    def __init__(self, time_budget=None, max_calls=None, target_size=None):
+        self.time_budget = time_budget  # seconds
+        self.max_calls = max_calls
+        self.target_size = target_size  # bytes
+
+        self.files = []
+        # The files whose total size is compared to target_size
+
+        self.accepted_size = None
+        # The size of the files in the last state the predicate accepted,
+        # see accepted
+
+        self.start = time.monotonic()
+        self.calls = 0
+        # The number of predicate runs so far
+
+    def limited(self):
+        """Return True iff there is any limit"""
+        return (
+            self.time_budget is not None
+            or self.max_calls is not None
+            or self.target_size is not None
+        )
+
+    def size(self):
+        """Return the total size of self.files"""
+        return sum(os.path.getsize(f) for f in self.files if os.path.exists(f))
+
+    def accepted(self):
+        """Record that the predicate passed on the files as they are"""
+        if self.target_size is not None:
+            self.accepted_size = self.size()
+
+    def exhausted(self):
+        """Return True iff the reduction should stop"""
+        if self.max_calls is not None and self.calls >= self.max_calls:
+            return True
+        if self.time_budget is not None:
+            if time.monotonic() - self.start >= self.time_budget:
+                return True
+        if self.target_size is not None and self.accepted_size is not None:
+            # Not the size of the candidate on disk, which is undone if
+            # the predicate does not accept it
+            if self.accepted_size <= self.target_size:
+                return True
+        return False
+
+
+class StepStats(object):
+    """What a step achieved so far, over all files"""
+
+    def __init__(self, prior):
+        self.prior = prior  # Expected fraction of a file removed
+        self.runs = 0
+        self.calls = 0  # Predicate runs
+        self.size = 0  # Size of the files before the runs
+        self.removed = 0  # Bytes removed
+
+    def expected_gain(self, size):
+        """Return the expected bytes removed per predicate run on a file
+        of the given size.
+        """
+        fraction = (self.removed + self.prior * PRIOR_WEIGHT) / (
+            self.size + PRIOR_WEIGHT
+        )
+        calls = (self.calls + PRIOR_CALLS) / (self.runs + 1)
+        return fraction * size / max(calls, 1)
+
+
+class Scheduler(object):
+    """Chooses which step to run on which file next: the one expected to
+    remove the most per predicate run. The steps are run in order on each
+    file.
+    """
+
+    def __init__(self, files, steps):
+        self.steps = steps  # The names of the steps to run, in order
+        self.stats = {step: StepStats(PRIORS[step]) for step in steps}
+        self.next_step = {f: 0 for f in files}
+        # For each file, the index in steps of the next step to run
+
+    def next_task(self):
+        """Return the (file, step) to run next, None if all are done"""
+        best = None
+        best_gain = -1
+        for file, index in self.next_step.items():
+            if index >= len(self.steps) or not os.path.exists(file):
+                continue
+            step = self.steps[index]
+            gain = self.stats[step].expected_gain(os.path.getsize(file))
+            if gain > best_gain:
+                best, best_gain = (file, step), gain
+        return best
+
+    def done(self, file, step, size, removed, calls):
+        """Record that step ran on file, of the given size before the run,
+        removing that many bytes with that many predicate runs.
+        """
+        self.next_step[file] += 1
+        stats = self.stats[step]
+        stats.runs += 1
+        stats.calls += calls
+        stats.size += size
+        stats.removed += max(removed, 0)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""Keep the history of a reduction in a run directory.
+
+The contents of the files are stored once, compressed, under
+objects/, named after their sha1. steps.jsonl records one step per
+line: its number, a label, and the digests of the files which changed
+since the previous step, null for files which were deleted.
+
+To list the steps of a run, or restore the files as they were at the end
+of a step:
+
+    python -m ada_reducer.snapshots RUN_DIR --list
+    python -m ada_reducer.snapshots RUN_DIR [--step N] [FILE ...]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import zlib
+
+from ada_reducer.workspace import CHANGES
+
+
+def default_run_dir():
+    """Return a new run directory name, in the current directory"""
+    return os.path.join(".adareducer", time.strftime("run-%Y%m%d-%H%M%S"))
+
+
+class SnapshotStore(object):
+    """A content-addressed store of the states of the files"""
+
+    def __init__(self, run_dir):
+        self.run_dir = os.path.abspath(run_dir)
+        self.steps_file = os.path.join(self.run_dir, "steps.jsonl")
+
+        self.current = {}
+        # The state at the last step: keys: absolute paths, values: digests
+
+        self.step = 0
+        # The number of the last step
+
+        self.changed = CHANGES.watch()
+        # The files modified by the reducer since the last step
+
+        if os.path.exists(self.steps_file):
+            for entry in self.entries():
+                self.current.update(entry["files"])
+                self.step = entry["step"]
+
+    def close(self):
+        """Stop following the modifications: no step is recorded after"""
+        CHANGES.unwatch(self.changed)
+
+    def object_file(self, digest):
+        return os.path.join(self.run_dir, "objects", digest[0:2], digest[2:])
+
+    def put(self, data):
+        """Store data, return its digest"""
+        digest = hashlib.sha1(data).hexdigest()
+        path = self.object_file(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(data))
+            os.replace(tmp, path)
+        return digest
+
+    def get(self, digest):
+        """Return the data stored under digest"""
+        with open(self.object_file(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def record(self, label, files=()):
+        """Record a step: the state of files, and of the files modified
+        by the reducer since the previous step. Return the step number.
+        """
+        paths = {os.path.abspath(f) for f in files} | self.changed
+        self.changed.clear()
+
+        delta = {}
+        for path in sorted(paths):
+            try:
+                with open(path, "rb") as f:
+                    digest = self.put(f.read())
+            except OSError:
+                digest = None
+            if path not in self.current or self.current[path] != digest:
+                delta[path] = digest
+                self.current[path] = digest
+
+        self.step += 1
+        entry = {"step": self.step, "label": label, "time": time.time()}
+        entry["files"] = delta
+        os.makedirs(self.run_dir, exist_ok=True)
+        with open(self.steps_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return self.step
+
+    def entries(self):
+        """Return the list of the recorded steps"""
+        with open(self.steps_file) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def state(self, step=None):
+        """Return the state at the end of step, the last one if None, as
+        a dict {absolute path: digest or None}.
+        """
+        result = {}
+        for entry in self.entries():
+            if step is not None and entry["step"] > step:
+                break
+            result.update(entry["files"])
+        return result
+
+    def restore(self, step=None, files=None):
+        """Put the files back as they were at the end of step, all the
+        files if files is None. Return the list of files restored.
+        """
+        state = self.state(step)
+        if files is not None:
+            wanted = {os.path.abspath(f) for f in files}
+            state = {p: d for p, d in state.items() if p in wanted}
+
+        for path, digest in sorted(state.items()):
+            if digest is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                with open(path, "wb") as f:
+                    f.write(self.get(digest))
+        return sorted(state)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Restore files from an adareducer run directory."
+    )
+    parser.add_argument("run_dir")
+    parser.add_argument(
+        "--list", action="store_true", help="List the steps of the run."
+    )
+    parser.add_argument(
+        "--step", type=int, help="Restore the state at the end of this step."
+    )
+    parser.add_argument("files", nargs="*", help="Only restore these files.")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.run_dir)
+    if args.list:
+        for entry in store.entries():
+            count = len(entry["files"])
+            print(f"{entry['step']:>6}  {entry['label']}  ({count} files)")
+        return
+
+    for path in store.restore(args.step, args.files or None):
+        print(f"restored {path}")
+
+
+if __name__ == "__main__":
+    main()
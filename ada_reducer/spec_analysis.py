@@ -0,0 +1,77 @@
+"""Find the specs which each spec of the project depends on.
+
+This is name resolution on every spec of the project, which can be
+spread over a pool of processes, each with its own unit provider and
+analysis context.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import libadalang as lal
+
+
+# Below this many specs, starting processes and loading the project in
+# each of them costs more than it saves.
+PARALLEL_THRESHOLD = 64
+
+# The analysis context of a worker process
+_context = None
+
+
+def init_worker(project_file):
+    global _context
+    provider = lal.UnitProvider.for_project(project_file)
+    _context = lal.AnalysisContext(unit_provider=provider)
+
+
+def withed_files(context, file):
+    """Return the list of files withed by file, other than through limited
+    with clauses, or None if file cannot be parsed.
+    """
+    root = context.get_from_file(file).root
+    if root is None:
+        return None
+
+    result = []
+    for w in root.findall(lambda x: x.is_a(lal.WithClause)):
+        if not w.children[0].is_a(lal.LimitedPresent):
+            # find the last id in w
+            ids = w.findall(lambda x: x.is_a(lal.Identifier))
+            if ids is not None:
+                id = ids[-1]
+                decl = id.p_referenced_defining_name()
+                if decl is not None:
+                    result.append(decl.unit.filename)
+    return result
+
+
+def analyze(files):
+    """Run in a worker: return [(file, withed_files)] for files"""
+    return [(f, withed_files(_context, f)) for f in files]
+
+
+def spec_dependencies(files, context, project_file, jobs):
+    """Return a dict {file: list of files it withs, or None} for files.
+
+    Use context, an analysis context or anything with a get_from_file
+    method, if jobs is 1 or if there are only a few files, otherwise a
+    pool of jobs processes loading project_file.
+    """
+    if jobs <= 1 or len(files) < PARALLEL_THRESHOLD:
+        return {f: withed_files(context, f) for f in files}
+
+    # Send the files in batches, several per process to balance the load
+    size = max(1, len(files) // (jobs * 4))
+    batches = [files[i : i + size] for i in range(0, len(files), size)]
+
+    result = {}
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(project_file,),
+    ) as pool:
+        for batch in pool.map(analyze, batches):
+            result.update(batch)
+    return result
@@ -0,0 +1,59 @@
+import time
+from contextlib import contextmanager
+
+
+class RunStats(object):
+    """Collects timings and counters for one reducer run"""
+
+    def __init__(self):
+        self.timings = []
+        # A list of (label, seconds), in the order they were recorded
+
+    @contextmanager
+    def time(self, label):
+        """Context manager recording the time spent in its body under label"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((label, time.perf_counter() - start))
+
+    def report(self, title):
+        """Return a printable breakdown of the recorded timings"""
+        if not self.timings:
+            return f"{title}: nothing recorded"
+        width = max(len(label) for label, _ in self.timings)
+        total = sum(seconds for _, seconds in self.timings)
+        result = [f"{title}:"]
+        for label, seconds in self.timings:
+            result.append(f"   {label:<{width}}  {seconds:8.3f}s")
+        result.append(f"   {'total':<{width}}  {total:8.3f}s")
+        return "\n".join(result)
+
+
+class PredicateStats(object):
+    """Counts the runs of the fast predicate and of the full one"""
+
+    def __init__(self):
+        self.fast_runs = 0
+        self.fast_failures = 0
+        # Each failure of the fast predicate is a run of the full one avoided
+        self.full_runs = 0
+
+        self.fast_time = 0.0
+        self.full_time = 0.0
+        # Seconds spent running each predicate
+
+    def report(self):
+        """Return a printable summary"""
+        full = self.full_time / self.full_runs if self.full_runs else 0
+        fast = self.fast_time / self.fast_runs if self.fast_runs else 0
+        return "\n".join(
+            [
+                "Predicate runs:",
+                f"   fast: {self.fast_runs} runs, {self.fast_failures} failed"
+                f" ({fast:.3f}s per run)",
+                f"   full: {self.full_runs} runs ({full:.3f}s per run)",
+                f"   full runs avoided: {self.fast_failures}",
+            ]
+        )
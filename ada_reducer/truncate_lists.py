@@ -0,0 +1,84 @@
+import libadalang as lal
+from ada_reducer.types import BufferSet, sloc_of
+from ada_reducer.interfaces import StrategyInterface
+from ada_reducer.remove_statement import RemoveStatement, RemoveDecl
+from ada_reducer.ast_index import index_of
+from ada_reducer.gui import log
+
+
+# Lists shorter than this are left to RemoveStatements
+MIN_LENGTH = 16
+
+
+def longest_removable(chunks, predicate, save, snapshot):
+    """Binary search the largest k such that chunks[0:k] can be actioned,
+    assuming that if chunks[0:k] can, so can chunks[0:j] for j < k.
+    Leave chunks[0:k] actioned and return k.
+    """
+    lo, hi = 0, len(chunks)
+    # chunks[0:lo] are actioned, chunks[0:hi + 1] cannot be
+
+    k = hi  # Attempt the whole list first
+    while lo < hi:
+        before = snapshot()
+        # Process the chunks in reverse position order, as dichotomize does
+        for chunk in sorted(chunks[lo:k], key=lambda c: c.start, reverse=True):
+            chunk.do()
+        save()
+        passed = False
+        try:
+            passed = predicate()
+        finally:
+            # See dichotomize
+            if not passed:
+                before.restore()
+                save()
+        if passed:
+            lo = k
+        else:
+            hi = k - 1
+        k = (lo + hi + 1) // 2
+    return lo
+
+
+class TruncateLists(StrategyInterface):
+    """Remove the longest removable prefix and suffix of long lists of
+       statements and declarations, in a logarithmic number of runs
+       of the predicate
+    """
+
+    def run_on_file(self, unit, buffer, predicate, save):
+        if unit.root is None:
+            return
+
+        buffers = BufferSet({buffer.filename: buffer})
+        index = index_of(unit)
+
+        lists = [(s, n, RemoveStatement) for n, s in index.entries(lal.StmtList)]
+        lists += [
+            (s, n, RemoveDecl) for n, s in index.entries(lal.DeclList, lal.AdaNodeList)
+        ]
+        # Outermost lists first
+        lists.sort(key=lambda l: (l[0][0:2], -l[0][2], -l[0][3]))
+
+        removed = []
+        # The (start, end) of the elements removed so far
+
+        for sloc, node, chunk_class in lists:
+            start, end = sloc[0:2], sloc[2:4]
+            if any(s <= start and end <= e for s, e in removed):
+                # This list is gone already
+                continue
+            children = [c for c in node.children if c is not None]
+            if len(children) < MIN_LENGTH:
+                continue
+
+            chunks = [chunk_class(c, sloc_of(c), buffer, False) for c in children]
+            prefix = longest_removable(chunks, predicate, save, buffers.snapshot)
+            suffix = longest_removable(
+                chunks[prefix:][::-1], predicate, save, buffers.snapshot
+            )
+            log(f"   truncated {prefix} + {suffix} of {len(chunks)} elements")
+
+            for c in chunks[:prefix] + chunks[len(chunks) - suffix :]:
+                removed.append((c.start, c.end))
@@ -1,7 +1,20 @@
 # Utility types
 
+import itertools
+import mmap
+import os
+import re
+import stat
+import tempfile
+import weakref
+from array import array
+
+from ada_reducer.workspace import CHANGES
+
 
 class SLOC(object):
+    __slots__ = ("line", "column")
+
     def __init__(self, line, column):
         self.line = line
         self.column = column
@@ -11,6 +24,8 @@ class SLOC(object):
 
 
 class SLOC_Range(object):
+    __slots__ = ("start", "end")
+
     def __init__(self, sloc_start, sloc_end):
         self.start = sloc_start
         self.end = sloc_end
@@ -19,52 +34,436 @@ class SLOC_Range(object):
         return f"{self.start}-{self.end}"
 
 
+def to_sloc_range(sloc):
+    """Return the SLOC_Range for a (start line, start column, end line,
+    end column) tuple"""
+    return SLOC_Range(SLOC(sloc[0], sloc[1]), SLOC(sloc[2], sloc[3]))
+
+
+def sloc_of(node):
+    """Return the sloc range of a libadalang node as a (start line,
+    start column, end line, end column) tuple"""
+    r = node.sloc_range
+    return (r.start.line, r.start.column, r.end.line, r.end.column)
+
+
+# The charset of the sources, which is also the default charset of
+# libadalang analysis contexts: the columns of slocs are counted in
+# characters of this charset. It maps each byte to one character, so
+# decoding and encoding back gives the original bytes.
+CHARSET = "latin-1"
+
+# Files larger than this are memory-mapped rather than read. Smaller
+# files are not worth keeping a file descriptor open for.
+MMAP_THRESHOLD = 1 << 20
+
+
+def read_source(filename):
+    """Return the contents of filename, as a mmap or a bytes object"""
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        # A mapped file cannot be replaced on Windows
+        if size >= MMAP_THRESHOLD and os.name != "nt":
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+
+def encode_lines(lines, newline=b"\n", final_newline=True):
+    """Yield the bytes for lines, a list of str without the extra None
+    at the top.
+    """
+    last = len(lines) - 1
+    for index, line in enumerate(lines):
+        yield line.encode(CHARSET)
+        if index < last or final_newline:
+            yield newline
+
+
+def write_source(filename, chunks):
+    """Write chunks, an iterable of bytes, to filename.
+
+    The file is written to a temporary file then moved over filename,
+    so that buffers mapping the previous contents remain valid.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".adareducer-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        try:
+            mode = stat.S_IMODE(os.stat(filename).st_mode)
+        except OSError:
+            mode = 0o644
+        os.chmod(tmp, mode)
+        os.replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class SourceText(object):
+    """The original bytes of a file, split into lines on demand"""
+
+    __slots__ = ("data", "offsets", "newline", "final_newline")
+
+    def __init__(self, data):
+        self.data = data
+        # A bytes or a mmap object
+
+        self.offsets = None
+        # Offsets of the start of each line, plus the end of data,
+        # computed on first access
+
+        self.final_newline = len(data) == 0 or data[-1:] == b"\n"
+        # Whether the last line ends with a line terminator
+
+        end = data.find(b"\n")
+        self.newline = b"\r\n" if end > 0 and data[end - 1 : end] == b"\r" else b"\n"
+        # The line terminator, from the first line
+
+    def index(self):
+        """Compute the offsets of the lines"""
+        offsets = array("q", [0])
+        offsets.extend(m.end() for m in re.finditer(b"\n", self.data))
+        size = len(self.data)
+        if offsets[-1] != size:
+            # The last line has no terminator
+            offsets.append(size + 1)
+        self.offsets = offsets
+
+    def line_count(self):
+        if self.offsets is None:
+            self.index()
+        return len(self.offsets) - 1
+
+    def line(self, number):
+        """Return the text of the line, 1-based, without its terminator"""
+        if self.offsets is None:
+            self.index()
+        end = self.offsets[number] - 1
+        if self.newline == b"\r\n" and self.data[end - 1 : end] == b"\r":
+            end -= 1
+        return self.data[self.offsets[number - 1] : end].decode(CHARSET)
+
+    def raw(self, first, last):
+        """Return the bytes of lines first to last, with their terminators,
+        without copying them.
+        """
+        if self.offsets is None:
+            self.index()
+        return memoryview(self.data)[self.offsets[first - 1] : self.offsets[last]]
+
+
+class ListText(object):
+    """Lines given as a list, with the interface of SourceText, for the
+    contents which are not read from a file.
+    """
+
+    __slots__ = ("lines", "newline", "final_newline")
+
+    def __init__(self, lines, newline=b"\n", final_newline=True):
+        self.lines = lines
+        # None, then the text of each line: it must not be modified
+
+        self.newline = newline
+        self.final_newline = final_newline
+
+    def line_count(self):
+        return len(self.lines) - 1
+
+    def line(self, number):
+        return self.lines[number]
+
+    def raw(self, first, last):
+        """Return the bytes of lines first to last, with their terminators"""
+        final_newline = last < self.line_count() or self.final_newline
+        lines = self.lines[first : last + 1]
+        return b"".join(encode_lines(lines, self.newline, final_newline))
+
+
+class LineArray(object):
+    """The lines of a buffer: None, then the text of each line, so that
+    line numbers correspond to indexes.
+
+    The lines are read from the original text, a SourceText or a ListText,
+    as they are accessed; edited lines are kept in an overlay. Lines can be
+    replaced but not inserted or removed: assign a list to Buffer.lines for
+    that.
+    """
+
+    __slots__ = ("text", "edits")
+
+    def __init__(self, text, edits=None):
+        self.text = text
+        self.edits = {} if edits is None else edits
+        # keys: line numbers, values: the new text of the line
+
+    @property
+    def count(self):
+        """The number of lines"""
+        return self.text.line_count()
+
+    def __len__(self):
+        return self.count + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index == 0:
+            return None
+        if not 0 < index <= self.count:
+            raise IndexError(index)
+        line = self.edits.get(index)
+        return self.text.line(index) if line is None else line
+
+    def __setitem__(self, index, line):
+        if not 0 < index <= self.count:
+            raise IndexError(index)
+        self.edits[index] = line
+
+    def __iter__(self):
+        yield None
+        for index in range(1, self.count + 1):
+            yield self[index]
+
+    def copy(self):
+        return LineArray(self.text, dict(self.edits))
+
+    def encode(self):
+        """Yield the bytes of the lines: the original bytes for the lines
+        which were not edited.
+        """
+        first = 1
+        for index in sorted(self.edits):
+            if first < index:
+                yield self.text.raw(first, index - 1)
+            yield self.edits[index].encode(CHARSET)
+            if index < self.count or self.text.final_newline:
+                yield self.text.newline
+            first = index + 1
+        if first <= self.count:
+            yield self.text.raw(first, self.count)
+
+
 class Buffer(object):
     """Represents the contents of a file"""
 
     def __init__(self, filename):
         """Reads the buffer from disk"""
         self.filename = filename
-        self.lines = []
-        # a list containing None plus the text of the file
+        self._lines = None
+        # a LineArray
+
+        self.newline = b"\n"
+        self.final_newline = True
+        # How lines are terminated in the file
+
+        self.shared = False
+        # Whether self.lines is referenced by a snapshot, in which case
+        # it must be copied before being modified in place.
+
+        self.dirty = False
+        # Whether the contents were modified since the last load or save
+
+        self.stamp = None
+        # (size, mtime) of the file after the last load or save
 
         self.load()
 
+    @property
+    def lines(self):
+        return self._lines
+
+    @lines.setter
+    def lines(self, lines):
+        if not isinstance(lines, LineArray):
+            # So that snapshots and edits don't copy all the lines
+            lines = LineArray(ListText(lines, self.newline, self.final_newline))
+        self._lines = lines
+        self.shared = False
+        self.dirty = True
+
     def load(self):
-        """ Return the contents of file as an array of lines, with
+        """ Read the contents of file as an array of lines, with
             an extra empty one at the top so that line numbers correspond
             to indexes
         """
-        with open(self.filename, "rb") as f:
-            try:
-                self.lines = [None] + f.read().decode("latin-1").splitlines()
-            except UnicodeDecodeError:
-                print(f"{self.filename}: could not decode latin-1, trying with unicode")
-                try:
-                    self.lines = [None] + f.read().decode().splitlines()
-                except UnicodeDecodeError:
-                    print("DECODE FAILED, skipping contents")
-                    self.lines = [None] + [""]
+        text = SourceText(read_source(self.filename))
+        self.newline = text.newline
+        self.final_newline = text.final_newline
+        self._lines = LineArray(text)
+        self.shared = False
+        self.dirty = False
+        self.stamp = self.file_stamp()
+
+    def file_stamp(self):
+        """Return (size, mtime) for the file, None if it doesn't exist"""
+        try:
+            st = os.stat(self.filename)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
 
     def save(self, to_file=None):
-        """ Write buffer to file from its line array, popping the one at first"""
-        with open(to_file if to_file is not None else self.filename, "w") as f:
-            f.write("\n".join(self.lines[1:]) + "\n")
+        """ Write buffer to file from its line array, popping the one at first.
+
+            When saving to its own file, only write if the contents changed
+            or if the file was modified behind our back, and record the
+            change in CHANGES.
+        """
+        if to_file is not None and to_file != self.filename:
+            self.write(to_file)
+            return
+
+        if not self.dirty and self.stamp is not None:
+            if self.file_stamp() == self.stamp:
+                return
+        self.write(self.filename)
+        self.dirty = False
+        self.stamp = self.file_stamp()
+        CHANGES.add(self.filename)
+
+    def write(self, filename):
+        """Write the lines to filename, with the original line terminators"""
+        write_source(filename, self._lines.encode())
 
     def replace(self, sloc_range, new_lines):
         """See below"""
-        return replace(self.lines, sloc_range, new_lines)
+        if self.shared:
+            self._lines = self._lines.copy()
+            self.shared = False
+        self.dirty = True
+        return replace(self._lines, sloc_range, new_lines)
+
+    def snapshot(self):
+        """Return an opaque snapshot of the contents, to pass to restore.
+
+        This is O(1): the lines are only copied by the next edit.
+        """
+        self.shared = True
+        return self._lines
+
+    def restore(self, snapshot):
+        """Go back to the contents at the time snapshot was taken, in O(1)"""
+        if snapshot is not self._lines:
+            self._lines = snapshot
+            self.dirty = True
+        self.shared = True
 
     def strip_tabs(self):
-        newlines = [None]
-        for l in self.lines[1:]:
-            newlines.append(l.replace("\t", ""))
-        self.lines = newlines
+        lines = None
+        for index, l in enumerate(itertools.islice(self._lines, 1, None), 1):
+            if "\t" in l:
+                if lines is None:
+                    # Leave self.lines as it was, for the caller to restore
+                    lines = self._lines.copy()
+                lines[index] = l.replace("\t", "")
+        if lines is not None:
+            self.lines = lines
 
     def count_chars(self):
         return count_chars(self.lines)
 
 
+class Snapshot(object):
+    """The contents of all the buffers of a BufferSet at a given time"""
+
+    __slots__ = ("buffers", "contents", "__weakref__")
+
+    def __init__(self, buffers):
+        self.buffers = buffers
+        self.contents = {file: buf.snapshot() for file, buf in buffers.items()}
+
+    def restore(self):
+        """Put all the buffers back to their contents in the snapshot"""
+        for file, buf in self.buffers.items():
+            buf.restore(self.contents[file])
+
+
+class BufferSet(dict):
+    """Buffers indexed by file name, loaded on first access"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.snapshots = weakref.WeakSet()
+        # The snapshots which are still referenced
+
+    def __missing__(self, file):
+        return self.add(file, Buffer(file))
+
+    def add(self, file, buf):
+        """Add buf, which is not modified, as the buffer for file"""
+        self[file] = buf
+        # The buffer did not change since the live snapshots were taken
+        for snapshot in self.snapshots:
+            snapshot.contents[file] = buf.snapshot()
+        return buf
+
+    def save(self):
+        """Save all the buffers"""
+        for buf in self.values():
+            buf.save()
+
+    def snapshot(self):
+        """Return a Snapshot of all the buffers"""
+        result = Snapshot(self)
+        self.snapshots.add(result)
+        return result
+
+
+class BufferRegistry(BufferSet):
+    """The buffers of all the files, shared by the engine and the
+    strategies so that each file is only read once.
+
+    save() does nothing: the modifications are only written by flush(),
+    which the engine calls before running the predicate or parsing the
+    sources. Files which are deleted or renamed must be removed from the
+    registry first, or flush() would write them back.
+    """
+
+    def save(self):
+        pass
+
+    def flush(self):
+        """Write the modified buffers"""
+        for buf in self.values():
+            if buf.dirty:
+                buf.save()
+
+    def view(self):
+        """Return a BufferView of self"""
+        return BufferView(self)
+
+    def evict(self):
+        """Write the modified buffers, and forget all the buffers: they are
+        read again when needed. Buffers from views and snapshots must not
+        be used any more.
+        """
+        self.flush()
+        self.clear()
+
+
+class BufferView(BufferSet):
+    """The buffers of a BufferRegistry which a strategy uses, shared with
+    the registry: snapshots of the view only cover these buffers.
+    """
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+
+    def __missing__(self, file):
+        # The strategy did not modify it yet
+        return self.add(file, self.registry[file])
+
+    def save(self):
+        pass
+
+
 def replace(lines, sloc_range, new_lines):
     """ Replace text at the given range with the new lines.
 
@@ -74,48 +473,29 @@ def replace(lines, sloc_range, new_lines):
 
        to ease undoing the replace"""
 
-    initial_len = len(lines)
+    start, end = sloc_range.start, sloc_range.end
 
     # cut
-    text = (
-        lines[sloc_range.start.line][0 : sloc_range.start.column - 1]
-        + lines[sloc_range.end.line][sloc_range.end.column - 1 :]
-    )
-    if sloc_range.end.line == sloc_range.start.line:
-        result = [
-            lines[sloc_range.start.line][
-                sloc_range.start.column - 1 : sloc_range.end.column - 1
-            ]
-        ]
+    prefix = lines[start.line][0 : start.column - 1]
+    suffix = lines[end.line][end.column - 1 :]
+    if end.line == start.line:
+        result = [lines[start.line][start.column - 1 : end.column - 1]]
     else:
-        result = [lines[sloc_range.start.line][sloc_range.start.column - 1 :]]
-        for j in range(sloc_range.start.line + 1, sloc_range.end.line):
+        result = [lines[start.line][start.column - 1 :]]
+        for j in range(start.line + 1, end.line):
             result.append(lines[j])
-        result.append(lines[sloc_range.end.line][0 : sloc_range.end.column - 1])
-        for j in range(sloc_range.end.line - sloc_range.start.line):
-            lines.pop(sloc_range.start.line)
-
-    lines[sloc_range.start.line] = text
+        result.append(lines[end.line][0 : end.column - 1])
 
-    # insert new text
+    # insert new text, in place: the number of lines must not change
     if len(new_lines) == 0:
-        pass
-    elif len(new_lines) == 1:
-        lines[sloc_range.start.line] = (
-            lines[sloc_range.start.line][0 : sloc_range.start.column - 1]
-            + new_lines[0]
-            + lines[sloc_range.start.line][sloc_range.start.column - 1 :]
-        )
+        block = [prefix + suffix]
     else:
-        end_bit = lines[sloc_range.start.line][sloc_range.start.column - 1 :]
-        lines[sloc_range.start.line] = (
-            lines[sloc_range.start.line][0 : sloc_range.start.column - 1] + new_lines[0]
-        )
-        for j in range(1, len(new_lines) - 1):
-            lines.insert(sloc_range.start.line + j, new_lines[j])
-        lines.insert(
-            sloc_range.start.line + len(new_lines) - 1, new_lines[-1] + end_bit
-        )
+        block = list(new_lines)
+        block[0] = prefix + block[0]
+        block[-1] = block[-1] + suffix
+    assert len(block) == end.line - start.line + 1
+    for j, line in enumerate(block):
+        lines[start.line + j] = line
 
     if len(new_lines) == 1:
         end_sloc = SLOC(
@@ -126,14 +506,13 @@ def replace(lines, sloc_range, new_lines):
             sloc_range.start.line + len(new_lines) - 1, len(new_lines[-1]) + 1
         )
 
-    assert len(lines) == initial_len
     return (SLOC_Range(sloc_range.start, end_sloc), result)
 
 
 def count_chars(lines):
     """ Count the characters in lines """
     count = 0
-    for l in lines[1:]:
+    for l in itertools.islice(lines, 1, None):
         count += len(l) + 1  # The + 1 is the line terminator
     return count
 
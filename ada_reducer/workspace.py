@@ -0,0 +1,104 @@
+import hashlib
+import os
+import time
+
+
+# Files modified less than this many nanoseconds before being hashed are
+# hashed again next time even if their size and timestamp did not change:
+# the timestamp granularity of the filesystem could hide a modification.
+RACY_DELAY = 2 * 10 ** 9
+
+
+class Workspace(object):
+    """The files which the predicate may depend on, and their contents.
+
+    Contents are identified by their sha1: the digest of a file is only
+    recomputed when its size or timestamp changes.
+    """
+
+    def __init__(self, files, root=None):
+        self.files = sorted({os.path.abspath(f) for f in files})
+        # The files in the workspace, as absolute paths
+
+        self.root = root if root is not None else os.path.commonpath(self.files)
+        # All the files are in this directory
+
+        self.digests = {}
+        # keys: absolute paths
+        # values: (size, mtime, digest) the last time the file was hashed
+
+    def relative(self, path):
+        """Return path relative to the root of the workspace, in posix form
+        so that it can be sent to other hosts.
+        """
+        return os.path.relpath(os.path.abspath(path), self.root).replace(os.sep, "/")
+
+    def digest(self, path):
+        """Return the digest of the contents of path, None if it doesn't exist"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.digests.pop(path, None)
+            return None
+
+        known = self.digests.get(path)
+        if known is not None and known[0:2] == (st.st_size, st.st_mtime_ns):
+            return known[2]
+
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        if st.st_mtime_ns < time.time_ns() - RACY_DELAY:
+            self.digests[path] = (st.st_size, st.st_mtime_ns, digest)
+        else:
+            self.digests.pop(path, None)
+        return digest
+
+    def state(self):
+        """Return the current state of the workspace, as a dict
+        keys: relative paths, values: digests or None for deleted files
+        """
+        return {self.relative(f): self.digest(f) for f in self.files}
+
+    def read(self, relative):
+        """Return the contents of the file at relative path"""
+        with open(os.path.join(self.root, relative), "rb") as f:
+            return f.read()
+
+
+class ChangeTracker(object):
+    """Records which files adareducer modified since the last run
+    of the predicate.
+    """
+
+    def __init__(self):
+        self.files = set()
+        self.watchers = []
+
+    def add(self, path):
+        """Record that path was written, created or removed"""
+        path = os.path.abspath(path)
+        self.files.add(path)
+        for watcher in self.watchers:
+            watcher.add(path)
+
+    def watch(self):
+        """Return a set which will also receive all the files modified
+        from now on, for another reader than the predicate.
+        """
+        watcher = set()
+        self.watchers.append(watcher)
+        return watcher
+
+    def unwatch(self, watcher):
+        """Stop adding the modified files to watcher, see watch"""
+        # Not list.remove: watchers with the same contents are equal
+        self.watchers = [w for w in self.watchers if w is not watcher]
+
+    def take(self):
+        """Return the sorted list of files modified since the last call"""
+        result = sorted(self.files)
+        self.files = set()
+        return result
+
+
+CHANGES = ChangeTracker()
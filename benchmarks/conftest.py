@@ -0,0 +1,152 @@
+"""Support for the microbenchmarks in this directory.
+
+Usage::
+
+    python -m pytest benchmarks
+
+Each benchmark is timed with the bench fixture, which takes the best of a
+few runs, and compared with its time in baseline.json: the test fails if
+it got slower by more than a factor of ADAREDUCER_BENCH_THRESHOLD (2 by
+default). Times are stored relative to a fixed calibration workload, so
+that the baseline can be used on machines of different speeds.
+
+To record the current times as the new baseline::
+
+    ADAREDUCER_BENCH_UPDATE=1 python -m pytest benchmarks
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Run a benchmark at most this many times, and for at most this many
+# seconds once it ran at least once
+MAX_ROUNDS = 5
+MAX_SECONDS = 1.0
+
+# Benchmarks faster than this many seconds are too noisy to be compared
+# with the baseline
+MIN_SECONDS = 0.005
+
+
+def best_time(function, setup=None):
+    """Return the best time, in seconds, of function(*setup()) over a few
+    rounds. setup is not timed.
+    """
+    best = None
+    deadline = time.perf_counter() + MAX_SECONDS
+    for _ in range(MAX_ROUNDS):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if time.perf_counter() > deadline:
+            break
+    return best
+
+
+def calibration_workload():
+    """A fixed amount of pure Python work, similar to what the benchmarks do"""
+    lines = [f"   X_{i} : Integer := {i};" for i in range(200000)]
+    sum(len(line) for line in lines)
+    sorted(lines, key=lambda line: line[::-1])
+
+
+class Results(object):
+    """The times of this session, and the baseline"""
+
+    def __init__(self):
+        self.times = {}
+        # keys: benchmark names, values: seconds
+
+        self.calibration = best_time(calibration_workload)
+
+        self.baseline = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                self.baseline = json.load(f)
+
+        self.update = bool(os.environ.get("ADAREDUCER_BENCH_UPDATE"))
+        self.threshold = float(os.environ.get("ADAREDUCER_BENCH_THRESHOLD", 2))
+
+    def record(self, name, seconds):
+        """Record the time of a benchmark, return an error message if it
+        is a regression.
+        """
+        self.times[name] = seconds
+        if self.update or name not in self.baseline or seconds < MIN_SECONDS:
+            return None
+        relative = seconds / self.calibration
+        expected = self.baseline[name]
+        if relative > expected * self.threshold:
+            return (
+                f"{name} took {relative:.3f} calibration units,"
+                f" {relative / expected:.1f} times the baseline ({expected:.3f})"
+            )
+        return None
+
+    def save(self):
+        baseline = dict(self.baseline)
+        for name, seconds in self.times.items():
+            baseline[name] = round(seconds / self.calibration, 4)
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    def curves(self):
+        """Return the lines of a report of the times, grouped by
+        benchmark, in order of size.
+        """
+        groups = {}
+        for name, seconds in self.times.items():
+            base, _, size = name.partition("[")
+            groups.setdefault(base, []).append((int(size.rstrip("]") or 0), seconds))
+        result = []
+        for base in sorted(groups):
+            points = "  ".join(
+                f"{size}: {seconds * 1000:.2f}ms"
+                for size, seconds in sorted(groups[base])
+            )
+            result.append(f"{base}  {points}")
+        return result
+
+
+RESULTS = None
+
+
+@pytest.fixture
+def bench(request):
+    """Return a function timing function(*setup()), see best_time, and
+    failing the test if it is a regression.
+    """
+    global RESULTS
+    if RESULTS is None:
+        RESULTS = Results()
+
+    def run(function, setup=None):
+        error = RESULTS.record(request.node.name, best_time(function, setup))
+        if error is not None:
+            pytest.fail(error)
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if RESULTS is not None and RESULTS.update:
+        RESULTS.save()
+
+
+def pytest_terminal_summary(terminalreporter):
+    if RESULTS is not None:
+        terminalreporter.section("benchmarks")
+        for line in RESULTS.curves():
+            terminalreporter.write_line(line)
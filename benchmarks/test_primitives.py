@@ -0,0 +1,155 @@
+"""Microbenchmarks of the primitives which every strategy relies on,
+over increasing file sizes and chunk counts. See conftest.py.
+"""
+
+import os
+
+import pytest
+
+from ada_reducer.dichotomy import dichotomize, to_tree
+from ada_reducer.interfaces import ChunkInterface
+from ada_reducer.priors import KIND_PRIORS
+from ada_reducer.types import Buffer, BufferSet, count_chars, to_sloc_range
+
+
+SIZES = [1000, 10000, 100000]
+# Number of lines of the generated sources
+
+CHUNK_COUNTS = [100, 1000, 10000]
+
+
+def generate(filename, count):
+    """Write a package of count lines to filename"""
+    with open(filename, "w") as f:
+        f.write("package Big is\n")
+        for i in range(count - 2):
+            f.write(f"   X_{i} : Integer := {i};  --  a comment\n")
+        f.write("end Big;\n")
+
+
+@pytest.fixture
+def source(tmp_path):
+    """Return a function generating a source of a given number of lines"""
+
+    def make(count):
+        filename = str(tmp_path / "big.ads")
+        generate(filename, count)
+        return filename
+
+    return make
+
+
+class BlankLine(ChunkInterface):
+    """Blank out a line, like the removal of a declaration"""
+
+    __slots__ = ("buffer", "start", "end")
+
+    def __init__(self, buffer, line, length):
+        self.buffer = buffer
+        self.start = (line, 1)
+        self.end = (line, length + 1)
+
+    def do(self):
+        self.buffer.replace(to_sloc_range(self.start + self.end), [""])
+
+
+class MockPredicate(object):
+    """A predicate which passes as long as the lines in needed are kept,
+    and reports its verdicts to KIND_PRIORS like the reducer does.
+    """
+
+    def __init__(self, buffer, needed):
+        self.buffer = buffer
+        self.needed = needed
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        passed = all(self.buffer.lines[line] != "" for line in self.needed)
+        KIND_PRIORS.verdict(passed)
+        return passed
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_replace(bench, source, size):
+    filename = source(size)
+
+    def setup():
+        return (Buffer(filename),)
+
+    def edit(buf):
+        # Blank out 100 blocks of 5 lines spread over the file
+        for line in range(2, size - 6, max(size // 100, 6)):
+            buf.replace(
+                to_sloc_range((line, 4, line + 4, len(buf.lines[line + 4]) + 1)),
+                [""] * 5,
+            )
+
+    bench(edit, setup)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_count_chars(bench, source, size):
+    buf = Buffer(source(size))
+    assert count_chars(buf.lines) == os.path.getsize(buf.filename)
+    bench(count_chars, lambda: (buf.lines,))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_save(bench, source, size):
+    filename = source(size)
+
+    def setup():
+        buf = Buffer(filename)
+        line = size // 2
+        buf.replace(to_sloc_range((line, 1, line, len(buf.lines[line]) + 1)), [""])
+        return (buf,)
+
+    bench(Buffer.save, setup)
+
+
+@pytest.mark.parametrize("count", CHUNK_COUNTS)
+def test_dichotomize(bench, source, count):
+    filename = source(count + 2)
+
+    def setup():
+        # Don't learn from the previous rounds
+        KIND_PRIORS.counts.clear()
+        buffers = BufferSet()
+        buf = buffers[filename]
+        chunks = [
+            BlankLine(buf, line, len(buf.lines[line])) for line in range(2, count + 2)
+        ]
+        # One declaration out of 50 is needed
+        predicate = MockPredicate(buf, set(range(2, count + 2, 50)))
+        return (chunks, predicate, buffers)
+
+    def run(chunks, predicate, buffers):
+        actioned, not_actioned = dichotomize(
+            chunks, predicate, lambda: None, buffers.snapshot
+        )
+        assert len(not_actioned) == len(predicate.needed)
+
+    bench(run, setup)
+
+
+class LocatedChunk(ChunkInterface):
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+
+@pytest.mark.parametrize("count", CHUNK_COUNTS)
+def test_to_tree(bench, count):
+    # Subprograms of 10 statements each
+    chunks = []
+    line = 1
+    while len(chunks) < count:
+        chunks.append(LocatedChunk((line, 1), (line + 11, 10)))
+        for j in range(1, 11):
+            chunks.append(LocatedChunk((line + j, 4), (line + j, 12)))
+        line += 12
+
+    bench(to_tree, lambda: (chunks,))
@@ -15,6 +15,7 @@ setup(
     entry_points={
         "console_scripts": [
             "adareducer = ada_reducer.main:main",
+            "adareducer-worker = ada_reducer.distributed:main",
         ]
     },
 )
@@ -1,6 +1,7 @@
-from src.types import SLOC, SLOC_Range, replace
-from src.interfaces import ChunkInterface
-from src.dichotomy import dichotomize
+from ada_reducer.types import SLOC, SLOC_Range, replace
+from ada_reducer.interfaces import ChunkInterface
+from ada_reducer.dichotomy import TreeNode, dichotomize, split
+from ada_reducer.priors import KIND_PRIORS, KindPriors, chunk_key
 
 lines = [None, "hello of fun", "beautiful", "world"]
 orig_lines = list(lines)
@@ -43,7 +44,7 @@ def test_replace_fun():
     orig_lines = list(lines)
 
     r = SLOC_Range(SLOC(7, 7), SLOC(11, 14))
-    new_range, old_text = replace(lines, r, ["null;", "npll;"])
+    new_range, old_text = replace(lines, r, ["null;", "npll;", "", "", ""])
     new_range, old_text = replace(lines, new_range, old_text)
     assert lines == orig_lines
 
@@ -52,7 +53,7 @@ def test_replace_params():
     lines = [None] + orig_text.split("\n")
     orig_lines = list(lines)
     r = SLOC_Range(SLOC(2, 7), SLOC(4, 42))
-    new_range, old_text = replace(lines, r, ["-- nothing"])
+    new_range, old_text = replace(lines, r, ["-- nothing", "", ""])
     new_range, old_text = replace(lines, new_range, old_text)
     assert lines == orig_lines
 
@@ -72,12 +73,70 @@ class DividerByTwoChunk(ChunkInterface):
 def test_dichotomy():
     l = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
     chunks = [DividerByTwoChunk(l, x) for x in range(0, len(l))]
-    res = dichotomize(chunks, lambda: all([int(x) == x for x in l]))
+    _, res = dichotomize(chunks, lambda: all([int(x) == x for x in l]), lambda: None)
     print(l)
     print("items not dividable by 2:", [l[x.index] for x in res])
 
 
+class KindChunk(ChunkInterface):
+    def __init__(self, kind):
+        self.kind = kind
+
+
+def test_chunk_key():
+    chunk = KindChunk("CallStmt")
+    assert chunk_key(chunk) == "KindChunk:CallStmt"
+    assert chunk_key(TreeNode(chunk)) == "KindChunk:CallStmt"
+    assert chunk_key(DividerByTwoChunk([], 0)) == "DividerByTwoChunk:None"
+
+
+def test_learn():
+    priors = KindPriors()
+    a, b = KindChunk("A"), KindChunk("B")
+    assert priors.probability(a) == 0.5
+
+    # Failures of several chunks blame none of them
+    priors.learn([a, b], False)
+    assert priors.counts == {}
+
+    priors.learn([a, b], True)
+    priors.learn([b], False)
+    assert priors.counts == {"KindChunk:A": [1, 1], "KindChunk:B": [1, 2]}
+    assert priors.probability(a) == 2 / 3
+    assert priors.probability(b) == 1 / 2
+
+    # Only the verdicts of the full predicate are learned from
+    priors.attempt([a])
+    priors.verdict(None)
+    priors.verdict(False)
+    assert priors.counts["KindChunk:A"] == [1, 1]
+    priors.attempt([a])
+    priors.verdict(False)
+    assert priors.counts["KindChunk:A"] == [1, 2]
+
+
+def test_split():
+    KIND_PRIORS.counts.clear()
+    likely = [KindChunk("Likely") for _ in range(3)]
+    unlikely = [KindChunk("Unlikely") for _ in range(5)]
+    KIND_PRIORS.learn(likely, True)
+    for c in unlikely:
+        KIND_PRIORS.learn([c], False)
+
+    # Without unlikely chunks, or with only them, split in halves
+    assert [len(g) for g in split(likely + likely[:1])] == [2, 2]
+    assert [len(g) for g in split(unlikely)] == [2, 3]
+
+    # Otherwise keep the unlikely chunks apart, still bisecting them
+    groups = split(unlikely[:2] + likely + unlikely[2:])
+    assert groups == [likely, unlikely[0:2], unlikely[2:]]
+    KIND_PRIORS.counts.clear()
+
+
 # test_dichotomy()
 test_replace()
 test_replace_fun()
 test_replace_params()
+test_chunk_key()
+test_learn()
+test_split()
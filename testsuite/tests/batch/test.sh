@@ -0,0 +1,9 @@
+# Two jobs sharing a single predicate slot. The second one can only run
+# the initial check of the predicate, so its file is left as it was.
+python -m ada_reducer.batch manifest.json --slots 1 --cache-dir cache > /dev/null
+cat one/hello.adb
+cat two/hello.adb
+grep -o "budget exhausted" logs/two.log
+
+# Each job must have its own name
+python -m ada_reducer.batch duplicate.json 2>&1 | grep -o "job name one appears more than once"
@@ -0,0 +1,9 @@
+with Ada.Text_IO;
+with Ada.Containers;
+with Ada.Strings;
+use Ada.Text_IO;
+
+procedure Hello is
+begin
+   Put_Line ("hello");
+end Hello;
@@ -0,0 +1,4 @@
+# Stop after 3 runs of the predicate, leaving the sources in a state
+# where the predicate passes.
+$ADAREDUCER --max-predicate-calls 3 --single-file hello.adb p.gpr oracle.sh | grep "budget exhausted"
+bash oracle.sh > /dev/null && echo "predicate passes"
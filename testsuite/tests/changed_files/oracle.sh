@@ -0,0 +1,2 @@
+echo "$ADAREDUCER_PREVIOUS_STATE_ID:$ADAREDUCER_PREVIOUS_VERDICT:$(cat $ADAREDUCER_CHANGED_FILES_MANIFEST | xargs -r -n1 basename | tr '\n' ' ')" >> ../history.txt
+gcc -c hello.adb
@@ -0,0 +1,11 @@
+mkdir work
+mv hello.adb p.gpr oracle.sh work
+cd work
+$ADAREDUCER --single-file hello.adb p.gpr oracle.sh > /dev/null
+cd ..
+
+# The first run has no previous state and no changes
+head -1 history.txt
+
+# The runs which follow are told that hello.adb changed
+grep -c "^[0-9]*:\(pass\|fail\):hello.adb $" history.txt > /dev/null && echo "hello.adb changed"
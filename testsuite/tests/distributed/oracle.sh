@@ -0,0 +1 @@
+gcc -c hello.adb
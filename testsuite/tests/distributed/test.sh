@@ -0,0 +1,15 @@
+# Start two predicate workers on localhost
+python -m ada_reducer.distributed --listen 127.0.0.1:17401 --workdir w1 > /dev/null 2>&1 &
+W1=$!
+python -m ada_reducer.distributed --listen 127.0.0.1:17402 --workdir w2 > /dev/null 2>&1 &
+W2=$!
+sleep 2
+
+# Nobody listens on the third address: that worker must be dropped,
+# and the reduction must proceed with the other two.
+$ADAREDUCER --single-file hello.adb \
+   --workers 127.0.0.1:17401,127.0.0.1:17402,127.0.0.1:17403 \
+   p.gpr oracle.sh > /dev/null
+
+kill $W1 $W2
+cat hello.adb
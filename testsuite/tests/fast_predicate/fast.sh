@@ -0,0 +1 @@
+gcc -c -gnatc hello.adb
@@ -0,0 +1,4 @@
+# The candidates which do not compile are rejected by the fast predicate
+$ADAREDUCER --single-file hello.adb --fast-predicate fast.sh p.gpr oracle.sh \
+   | grep -o "full runs avoided"
+cat hello.adb
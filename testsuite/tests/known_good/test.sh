@@ -0,0 +1,4 @@
+# The attempt to delete hello.adb fails and puts it back as it was when
+# the predicate last passed: the final sanity check is not needed.
+$ADAREDUCER --single-file hello.adb p.gpr oracle.sh | grep -o "sanity check skipped"
+cat hello.adb
@@ -0,0 +1,11 @@
+with Pkg_A;
+with Pkg_B;
+with Pkg_C;
+with Pkg_D;
+procedure Main is
+begin
+   Pkg_A.Run;
+   Pkg_B.Run;
+   Pkg_C.Run;
+   Pkg_D.Run;
+end Main;
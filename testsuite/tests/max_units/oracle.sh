@@ -0,0 +1,2 @@
+# Main must still call Pkg_C.Run
+gcc -c main.adb && grep -q "Pkg_C.Run" main.adb
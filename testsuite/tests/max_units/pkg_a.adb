@@ -0,0 +1,7 @@
+with Ada.Text_IO;
+package body Pkg_A is
+   procedure Run is
+   begin
+      Ada.Text_IO.Put_Line ("a");
+   end Run;
+end Pkg_A;
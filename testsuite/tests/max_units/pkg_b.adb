@@ -0,0 +1,7 @@
+with Ada.Text_IO;
+package body Pkg_B is
+   procedure Run is
+   begin
+      Ada.Text_IO.Put_Line ("b");
+   end Run;
+end Pkg_B;
@@ -0,0 +1,7 @@
+with Ada.Text_IO;
+package body Pkg_C is
+   procedure Run is
+   begin
+      Ada.Text_IO.Put_Line ("c");
+   end Run;
+end Pkg_C;
@@ -0,0 +1,7 @@
+with Ada.Text_IO;
+package body Pkg_D is
+   procedure Run is
+   begin
+      Ada.Text_IO.Put_Line ("d");
+   end Run;
+end Pkg_D;
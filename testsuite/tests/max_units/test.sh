@@ -0,0 +1,7 @@
+# A small limit on the number of units makes the reducer recycle its
+# analysis context while analyzing the specs of the project, which must
+# not change the result.
+$ADAREDUCER --max-units 2 p.gpr oracle.sh > out.txt
+grep -o "recycling the analysis context" out.txt | head -1
+grep -o "Peak memory" out.txt
+bash oracle.sh && echo "predicate passes"
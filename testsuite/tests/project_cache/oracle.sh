@@ -0,0 +1,2 @@
+# This predicate never holds: adareducer stops right after loading the project
+exit 1
@@ -0,0 +1,27 @@
+# The first run loads the project and fills the cache, the second one
+# finds the sources in the cache.
+$ADAREDUCER --timing --cache-dir cache p.gpr oracle.sh | grep -o "load project\|read project cache"
+$ADAREDUCER --timing --cache-dir cache p.gpr oracle.sh | grep -o "load project\|read project cache"
+
+# Touching the project invalidates the cache
+echo "" >> p.gpr
+$ADAREDUCER --timing --cache-dir cache p.gpr oracle.sh | grep -o "load project\|read project cache"
+
+# Rewriting a source, as adareducer does when saving, keeps the cache
+cp hello.adb hello.adb.tmp
+mv hello.adb.tmp hello.adb
+$ADAREDUCER --timing --cache-dir cache p.gpr oracle.sh | grep -o "load project\|read project cache"
+
+# Adding a source invalidates it
+cp hello.adb other.adb
+$ADAREDUCER --timing --cache-dir cache p.gpr oracle.sh | grep -o "load project\|read project cache"
+rm other.adb
+
+# Adding a source in a new subdirectory of a source directory declared
+# with "**" invalidates it, even though the directory held no sources
+mkdir -p src
+printf 'project p is\n   for Source_Dirs use (".", "src/**");\nend p;\n' > p.gpr
+$ADAREDUCER --timing --cache-dir cache p.gpr oracle.sh | grep -o "load project\|read project cache"
+mkdir src/sub
+echo "package Extra is end Extra;" > src/sub/extra.ads
+$ADAREDUCER --timing --cache-dir cache p.gpr oracle.sh | grep -o "load project\|read project cache"
@@ -0,0 +1,5 @@
+with Pkg;
+procedure Hello is
+begin
+   Pkg.Say;
+end Hello;
@@ -0,0 +1,12 @@
+with Ada.Text_IO;
+package body Pkg is
+   procedure Say is
+   begin
+      Ada.Text_IO.Put_Line ("hello");
+   end Say;
+
+   procedure Unused is
+   begin
+      null;
+   end Unused;
+end Pkg;
@@ -0,0 +1,6 @@
+$ADAREDUCER --project-wide p.gpr oracle.sh > /dev/null
+
+# Unused is gone from both files, and the program still works
+grep -c Unused pkg.ads pkg.adb
+gprbuild -q -m2 -Pp > /dev/null
+./hello
@@ -0,0 +1,7 @@
+with Ada.Text_IO;
+procedure Hello is
+begin
+   --  Say hello
+   Ada.Text_IO.Put_Line ("hello");
+   Ada.Text_IO.Put_Line ("world");
+end Hello;
@@ -0,0 +1,37 @@
+"""Reduce hello.adb with a predicate function, and check the events
+received by a listener.
+"""
+
+import os
+import subprocess
+
+from ada_reducer.engine import Reducer
+
+
+def predicate(request):
+    # This raises FileNotFoundError when the reducer attempts to delete
+    # hello.adb, which must count as a failure.
+    with open("hello.adb") as f:
+        if '"hello"' not in f.read():
+            return False
+    return subprocess.run(["gcc", "-c", "hello.adb"]).returncode == 0
+
+
+events = []
+reducer = Reducer("p.gpr", predicate, single_file="hello.adb")
+reducer.add_listener(lambda event, details: events.append((event, details)))
+reducer.run()
+
+steps = [d["step"] for e, d in events if e == "step" and d["file"] is not None]
+verdicts = {d["verdict"] for e, d in events if e == "predicate"}
+
+with open("events.txt", "w") as report:
+    print("first event:", events[0][0], events[0][1]["verdict"], file=report)
+    print("last event:", events[-1][0], file=report)
+    print("steps:", " ".join(steps), file=report)
+    for event, details in events:
+        if event == "file":
+            print("reduced:", os.path.basename(details["file"]), file=report)
+            removed = details["characters_removed"] > 0
+            print("characters removed:", removed, file=report)
+    print("verdicts:", sorted(verdicts), file=report)
@@ -0,0 +1,4 @@
+# The predicate is a Python function, called in the reducer process
+python reduce.py > /dev/null
+cat events.txt
+cat hello.adb
@@ -0,0 +1,6 @@
+# No .orig copy is written next to the sources, and the original
+# contents can be restored from the run directory.
+$ADAREDUCER --single-file hello.adb --run-dir run p.gpr oracle.sh > /dev/null
+ls hello.adb.orig 2> /dev/null
+python -m ada_reducer.snapshots run --step 1 hello.adb > /dev/null
+cat hello.adb
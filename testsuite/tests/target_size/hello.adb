@@ -0,0 +1,79 @@
+with Ada.Text_IO; use Ada.Text_IO;
+
+procedure Hello is
+
+   procedure Unused_1 is
+   begin
+      Put_Line ("This procedure is never called, number 1");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_1;
+
+   procedure Unused_2 is
+   begin
+      Put_Line ("This procedure is never called, number 2");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_2;
+
+   procedure Unused_3 is
+   begin
+      Put_Line ("This procedure is never called, number 3");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_3;
+
+   procedure Unused_4 is
+   begin
+      Put_Line ("This procedure is never called, number 4");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_4;
+
+   procedure Unused_5 is
+   begin
+      Put_Line ("This procedure is never called, number 5");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_5;
+
+   procedure Unused_6 is
+   begin
+      Put_Line ("This procedure is never called, number 6");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_6;
+
+   procedure Unused_7 is
+   begin
+      Put_Line ("This procedure is never called, number 7");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_7;
+
+   procedure Unused_8 is
+   begin
+      Put_Line ("This procedure is never called, number 8");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_8;
+
+   procedure Unused_9 is
+   begin
+      Put_Line ("This procedure is never called, number 9");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_9;
+
+   procedure Unused_10 is
+   begin
+      Put_Line ("This procedure is never called, number 10");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_10;
+
+   procedure Unused_11 is
+   begin
+      Put_Line ("This procedure is never called, number 11");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_11;
+
+   procedure Unused_12 is
+   begin
+      Put_Line ("This procedure is never called, number 12");
+      Put_Line ("so that the reducer can remove it");
+   end Unused_12;
+
+begin
+   Put_Line ("hello");
+end Hello;
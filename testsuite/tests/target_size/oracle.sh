@@ -0,0 +1,3 @@
+set -e
+gprbuild -m2 -Pp
+./hello | grep "hello"
\ No newline at end of file
@@ -0,0 +1,6 @@
+# Stop once hello.adb is at most 1000 bytes, leaving the sources in a
+# state where the predicate passes.
+$ADAREDUCER --target-size 1000 --single-file hello.adb p.gpr oracle.sh \
+   | grep -o "budget exhausted" | head -1
+test $(wc -c < hello.adb) -le 1000 && echo "target size reached"
+bash oracle.sh > /dev/null && echo "predicate passes"
@@ -0,0 +1,6 @@
+with Ada.Text_IO;
+with Pkg;
+procedure Hello is
+begin
+   Ada.Text_IO.Put_Line ("hello" & Integer'Image (Pkg.C_10));
+end Hello;
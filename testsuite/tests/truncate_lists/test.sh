@@ -0,0 +1,4 @@
+# Only the constant in the middle is needed: the others are removed by
+# binary searching the longest removable prefix and suffix.
+$ADAREDUCER --single-file pkg.ads p.gpr oracle.sh | grep "truncated"
+cat pkg.ads
@@ -0,0 +1,4 @@
+# The two unused with clauses are found without running the predicate,
+# though Ada is in the prefix of a name
+$ADAREDUCER --single-file hello.adb p.gpr oracle.sh | grep -o "removed 2 unused clauses"
+cat hello.adb
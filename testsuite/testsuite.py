@@ -10,6 +10,7 @@ Run the adareducer testsuite. This requires e3-testsuite.
 
 import os
 import sys
+import tempfile
 
 import e3.testsuite
 
@@ -33,6 +34,9 @@ class AdaReducerTestsuite(e3.testsuite.Testsuite):
     def set_up(self) -> None:
         super().set_up()
 
+        # Do not let the tests use or fill the user's cache
+        os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="adareducer-cache-")
+
         if self.env.options.auto_path:
             # Set PYTHONPATH to find adareducer
             root_dir = os.path.abspath(